@@ -0,0 +1,181 @@
+"""Offline benchmarks for the Snitch and Recorder message paths.
+
+Run from the repository root with discord.py and Red installed:
+
+    python benchmarks/bench_cogs.py
+    python benchmarks/bench_cogs.py --words 10 1000 --groups 1 20 --latency 0.05 --rate-limit-every 50
+
+Each scenario builds a fake server, a Snitch with its notification groups loaded into an in-memory Config, and a
+Recorder writing to a temporary folder, then pushes synthetic messages through the shared ingest exactly as the
+on_message listener would. Sends go to a mock layer with configurable latency and injected 429s.
+
+Reported per scenario:
+    msg/s        Messages handled per second, counting only the listener, not the notifications it queued.
+    p50/p99 us   Listener latency per message.
+    drain s      Time for the dispatcher to finish every queued notification afterwards.
+    KiB/msg      Memory still held per message at the end of a second, traced pass. Steady growth here is a leak.
+    peak KiB     The most memory allocated at once during the traced pass.
+"""
+import argparse
+import asyncio
+import pathlib
+import random
+import string
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+import fakes  # noqa: E402
+import recorder.recorder as recorder_module  # noqa: E402
+import snitch.dispatch as dispatch_module  # noqa: E402
+import snitch.snitch as snitch_module  # noqa: E402
+from snitch.ingest import MessageIngest  # noqa: E402
+
+FILLER = (
+    "hey does anyone know why the network keeps dropping in the main hall my laptop says connected but nothing "
+    "loads tried restarting it twice already and the projector in room is doing the same thing"
+).split()
+
+
+def random_words(rng: random.Random, count: int) -> list:
+    return [
+        "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 10)))
+        for _ in range(count)
+    ]
+
+
+def make_messages(rng, guild, words, count, hit_rate):
+    authors = [m for m in guild.members if not m.bot]
+    messages = []
+    for _ in range(count):
+        body = rng.sample(FILLER, 12)
+        if rng.random() < hit_rate:
+            body.insert(rng.randrange(len(body)), rng.choice(words))
+        messages.append(
+            fakes.FakeMessage(guild, rng.choice(guild.channels), rng.choice(authors), " ".join(body))
+        )
+    return messages
+
+
+async def setup(args, word_count, group_count):
+    rng = random.Random(args.seed)
+    layer = fakes.SendLayer(args.latency, args.rate_limit_every)
+    guild = fakes.build_guild(layer, args.members, args.role_size, seed=args.seed)
+    bot = fakes.FakeBot()
+
+    snitch = snitch_module.Snitch(bot)
+    recorder = recorder_module.Recorder(bot)
+    words = random_words(rng, word_count)
+    notifygroups = {}
+    for number in range(group_count):
+        targets = {
+            "notify": {"id": guild.roles[0].id, "type": "Role"},
+            "member": {"id": guild.members[number % len(guild.members)].id, "type": "Member"},
+            "channel": {"id": guild.channels[number % len(guild.channels)].id, "type": "TextChannel"},
+        }
+        notifygroups[f"group{number}"] = {"words": words[number::group_count], "targets": targets}
+    await snitch.config.guild(guild).notifygroups.set(notifygroups)
+    await snitch.cog_load()
+    await recorder.cog_load()
+    messages = make_messages(rng, guild, words, args.messages, args.hit_rate)
+    return layer, snitch, recorder, MessageIngest.attach(bot), messages
+
+
+async def teardown(snitch, recorder):
+    await snitch.cog_unload()
+    await recorder.cog_unload()
+
+
+async def run_scenario(args, word_count, group_count):
+    with tempfile.TemporaryDirectory() as folder:
+        recorder_module.cog_data_path = lambda *a, **k: pathlib.Path(folder)
+        layer, snitch, recorder, ingest, messages = await setup(args, word_count, group_count)
+        # Warm the matcher cache so steady state is what gets measured.
+        await ingest.dispatch(ingest.facts(messages[0]))
+        latencies = []
+        start = time.perf_counter()
+        for message in messages:
+            began = time.perf_counter()
+            await ingest.dispatch(ingest.facts(message))
+            latencies.append(time.perf_counter() - began)
+        elapsed = time.perf_counter() - start
+        drain_start = time.perf_counter()
+        await snitch.dispatcher.join()
+        drain = time.perf_counter() - drain_start
+        sends, rate_limits = layer.sends, layer.rate_limits
+        await teardown(snitch, recorder)
+
+    with tempfile.TemporaryDirectory() as folder:
+        recorder_module.cog_data_path = lambda *a, **k: pathlib.Path(folder)
+        _, snitch, recorder, ingest, messages = await setup(args, word_count, group_count)
+        await ingest.dispatch(ingest.facts(messages[0]))
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        for message in messages:
+            await ingest.dispatch(ingest.facts(message))
+        after = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        allocated = sum(s.size_diff for s in after.compare_to(before, "filename") if s.size_diff > 0)
+        await snitch.dispatcher.join()
+        await teardown(snitch, recorder)
+
+    latencies.sort()
+    return {
+        "words": word_count,
+        "groups": group_count,
+        "msg/s": len(messages) / elapsed,
+        "p50 us": latencies[len(latencies) // 2] * 1e6,
+        "p99 us": latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] * 1e6,
+        "drain s": drain,
+        "sends": sends,
+        "429s": rate_limits,
+        "KiB/msg": allocated / 1024 / len(messages),
+        "peak KiB": peak / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--groups", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--hit-rate", type=float, default=0.05, help="Fraction of messages with a trigger word.")
+    parser.add_argument("--members", type=int, default=500)
+    parser.add_argument("--role-size", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds each mock send takes.")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="Inject a 429 on every Nth send.")
+    parser.add_argument(
+        "--real-rate-limits",
+        action="store_true",
+        help="Keep the dispatcher's token bucket rates. By default they're lifted so drain time shows CPU cost.",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Keep everything in memory and off Red's data storage.
+    snitch_module.Config = fakes.FakeConfig
+    recorder_module.Config = fakes.FakeConfig
+
+    if not args.real_rate_limits:
+        dispatch_module.DM_RATE = dispatch_module.CHANNEL_RATE = 1e9
+        dispatch_module.DM_BURST = dispatch_module.CHANNEL_BURST = 1000000
+
+    columns = ["words", "groups", "msg/s", "p50 us", "p99 us", "drain s", "sends", "429s", "KiB/msg", "peak KiB"]
+    print(" ".join(f"{c:>9}" for c in columns))
+    for word_count in args.words:
+        for group_count in args.groups:
+            result = asyncio.run(run_scenario(args, word_count, group_count))
+            print(
+                " ".join(
+                    f"{result[c]:>9.2f}" if isinstance(result[c], float) else f"{result[c]:>9}"
+                    for c in columns
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
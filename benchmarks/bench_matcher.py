@@ -0,0 +1,91 @@
+"""Per-message latency of Snitch's trigger matcher as the word list grows.
+
+Run from the repository root:
+
+    python benchmarks/bench_matcher.py
+
+The matcher module doesn't depend on Red, so this runs without a bot install. The old approach (one regex alternation
+per group) is timed alongside for comparison. The same words are timed again with every group normalized, against a
+message that only matches once it's normalized.
+"""
+import pathlib
+import random
+import re
+import itertools
+import string
+import sys
+import timeit
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "snitch"))
+
+import matcher  # noqa: E402
+
+SIZES = [10, 100, 1000, 10000]
+GROUPS = 10
+MESSAGE = (
+    "hey does anyone know why the wifi keeps dropping in the main hall? my laptop says connected but nothing "
+    "loads, tried restarting it twice already and the projector in room 4 is doing the same thing lol"
+)
+# Most messages don't trigger anything, so time the pre-filter on one of those too.
+QUIET_MESSAGE = MESSAGE.replace("wifi", "network")
+# What normalized groups are for: a homoglyph, a zero-width space, markdown, and repeated letters.
+EVASIVE_MESSAGE = MESSAGE.replace("wifi", "W\u0456\u200b**fiii**")
+
+
+def random_words(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    return [
+        "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10)))
+        for _ in range(count)
+    ]
+
+
+def regex_groups(groups: dict) -> list:
+    return [
+        re.compile("|".join(rf"\b{re.escape(w)}\b" for w in words), flags=re.I)
+        for words in groups.values()
+    ]
+
+
+def bench(func, number: int) -> float:
+    """Best of five runs, in microseconds per call."""
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    engine = "pyahocorasick" if matcher.ahocorasick is not None else "pure python"
+    print(f"Engine: {engine}, {GROUPS} groups, {len(MESSAGE)} character message")
+    print(f"{'words':>8} {'matcher us/msg':>16} {'screen us/msg':>15} {'regex us/msg':>14}")
+    for size in SIZES:
+        words = random_words(size) + ["wifi"]
+        groups = {f"group{i}": words[i::GROUPS] for i in range(GROUPS)}
+        trigger_matcher = matcher.TriggerMatcher(groups)
+        patterns = regex_groups(groups)
+        assert trigger_matcher.find(MESSAGE)
+        assert not trigger_matcher.could_match(QUIET_MESSAGE)
+        matcher_us = bench(lambda: trigger_matcher.find(MESSAGE), 2000)
+        screen_us = bench(lambda: trigger_matcher.could_match(QUIET_MESSAGE), 2000)
+        regex_us = bench(lambda: [p.findall(MESSAGE) for p in patterns], 200)
+        print(f"{size:>8} {matcher_us:>16.1f} {screen_us:>15.1f} {regex_us:>14.1f}")
+    print()
+    print("Normalized groups")
+    print(f"{'words':>8} {'normalize us/msg':>18} {'matcher us/msg':>16} {'screen us/msg':>15}")
+    quiet_tokens = set(matcher._WORD.findall(matcher.normalize(QUIET_MESSAGE)))
+    for size in SIZES:
+        # Collapsing repeats turns some random words into real ones ("rrom" into "rom"), so leave those out.
+        words = [w for w in random_words(size) if matcher.normalize(w) not in quiet_tokens] + ["wifi"]
+        groups = {f"group{i}": words[i::GROUPS] for i in range(GROUPS)}
+        group_matcher = matcher.GroupMatcher(groups, groups.keys())
+        assert group_matcher.find(EVASIVE_MESSAGE)
+        assert not group_matcher.could_match(QUIET_MESSAGE)
+        normalize_us = bench(lambda: matcher.normalize(EVASIVE_MESSAGE), 2000)
+        # Alternate between two copies of each message so the matcher can't reuse the text it normalized last time.
+        evasive = itertools.cycle([EVASIVE_MESSAGE, EVASIVE_MESSAGE[:-1] + EVASIVE_MESSAGE[-1]])
+        quiet = itertools.cycle([QUIET_MESSAGE, QUIET_MESSAGE[:-1] + QUIET_MESSAGE[-1]])
+        matcher_us = bench(lambda: group_matcher.find(next(evasive)), 2000)
+        screen_us = bench(lambda: group_matcher.could_match(next(quiet)), 2000)
+        print(f"{size:>8} {normalize_us:>18.1f} {matcher_us:>16.1f} {screen_us:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
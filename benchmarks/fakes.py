@@ -0,0 +1,274 @@
+"""In-memory stand-ins for Red's Config and the bits of discord.py the cogs touch.
+
+These let the benchmarks drive the real cog code without a Discord connection. discord.py and Red still need to be
+installed since the cogs import them, but nothing here talks to the network or Red's data storage.
+"""
+import asyncio
+import copy
+import datetime
+import itertools
+import random
+from typing import Dict, List, Optional
+import discord
+
+_ids = itertools.count(100000000000000000)
+
+
+def next_id() -> int:
+    return next(_ids)
+
+
+class _ValueContext:
+    """What calling a config value returns: awaitable for a copy, or an async context manager that writes back."""
+
+    def __init__(self, value: "_Value"):
+        self._value = value
+        self._raw = None
+
+    def __await__(self):
+        return self._get().__await__()
+
+    async def _get(self):
+        return copy.deepcopy(self._value.get())
+
+    async def __aenter__(self):
+        self._raw = copy.deepcopy(self._value.get())
+        return self._raw
+
+    async def __aexit__(self, *exc):
+        self._value.store[self._value.key] = self._raw
+
+
+class _Value:
+    def __init__(self, store: dict, key: str, default):
+        self.store = store
+        self.key = key
+        self.default = default
+
+    def get(self):
+        return self.store.get(self.key, self.default)
+
+    def __call__(self) -> _ValueContext:
+        return _ValueContext(self)
+
+    async def set(self, value):
+        self.store[self.key] = copy.deepcopy(value)
+
+    async def clear(self):
+        self.store.pop(self.key, None)
+
+
+class _Group:
+    def __init__(self, store: dict, defaults: dict):
+        self._store = store
+        self._defaults = defaults
+
+    def __getattr__(self, name: str) -> _Value:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return _Value(self._store, name, self._defaults.get(name))
+
+    async def all(self) -> dict:
+        merged = copy.deepcopy(self._defaults)
+        merged.update(copy.deepcopy(self._store))
+        return merged
+
+
+class FakeConfig:
+    """Drop-in for redbot.core.Config covering what the cogs use, kept entirely in memory."""
+
+    def __init__(self):
+        self._globals: dict = {}
+        self._global_defaults: dict = {}
+        self._guilds: Dict[int, dict] = {}
+        self._guild_defaults: dict = {}
+
+    @classmethod
+    def get_conf(cls, cog, identifier: int, **kwargs) -> "FakeConfig":
+        return cls()
+
+    def register_global(self, **defaults):
+        self._global_defaults.update(defaults)
+
+    def register_guild(self, **defaults):
+        self._guild_defaults.update(defaults)
+
+    def guild(self, guild) -> _Group:
+        return _Group(self._guilds.setdefault(guild.id, {}), self._guild_defaults)
+
+    def __getattr__(self, name: str) -> _Value:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return _Value(self._globals, name, self._global_defaults.get(name))
+
+    async def all_guilds(self) -> Dict[int, dict]:
+        return {guild_id: await self.guild(_Id(guild_id)).all() for guild_id in self._guilds}
+
+
+class _Id:
+    def __init__(self, id: int):
+        self.id = id
+
+
+class SendLayer:
+    """Where every fake send ends up. Adds latency and injects rate limits."""
+
+    def __init__(self, latency: float = 0.0, rate_limit_every: int = 0, retry_after: float = 0.05):
+        """
+        :param latency: Seconds each send takes.
+        :param rate_limit_every: Raise discord.RateLimited on every Nth send. 0 never does.
+        :param retry_after: The retry_after on injected rate limits.
+        """
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.sends = 0
+        self.rate_limits = 0
+
+    async def send(self):
+        self.sends += 1
+        if self.rate_limit_every and self.sends % self.rate_limit_every == 0:
+            self.rate_limits += 1
+            raise discord.RateLimited(self.retry_after)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+
+class FakeAsset:
+    url = "https://cdn.discordapp.com/embed/avatars/0.png"
+
+
+class FakeRole:
+    def __init__(self, guild: "FakeGuild", name: str):
+        self.id = next_id()
+        self.name = name
+        self.guild = guild
+
+    @property
+    def members(self) -> List["FakeMember"]:
+        # Like discord.py, this walks every member in the server.
+        return [m for m in self.guild.members if self in m.roles]
+
+
+class FakeMember(discord.Member):
+    """Passes isinstance checks for discord.Member. The class attributes shadow discord.py's read-only properties."""
+
+    id = name = display_name = discriminator = bot = roles = guild = display_avatar = None
+
+    def __init__(self, guild: "FakeGuild", name: str, layer: SendLayer, bot: bool = False):
+        self.id = next_id()
+        self.name = name
+        self.display_name = name.title()
+        self.discriminator = "0"
+        self.bot = bot
+        self.roles = []
+        self.guild = guild
+        self.display_avatar = FakeAsset()
+        self._layer = layer
+
+    def __repr__(self) -> str:
+        return f"<FakeMember {self.name}>"
+
+    def __hash__(self) -> int:
+        return self.id >> 22
+
+    async def send(self, content=None, *, embed=None, **kwargs):
+        await self._layer.send()
+
+
+class FakeChannel:
+    def __init__(self, guild: "FakeGuild", name: str, layer: SendLayer):
+        self.id = next_id()
+        self.name = name
+        self.guild = guild
+        self._layer = layer
+
+    def __str__(self) -> str:
+        return self.name
+
+    async def send(self, content=None, *, embed=None, **kwargs):
+        await self._layer.send()
+
+
+class FakeGuild:
+    def __init__(self, name: str):
+        self.id = next_id()
+        self.name = name
+        self.members: List[FakeMember] = []
+        self.roles: List[FakeRole] = []
+        self.channels: List[FakeChannel] = []
+
+    def get_member(self, id: int) -> Optional[FakeMember]:
+        return next((m for m in self.members if m.id == id), None)
+
+    def get_role(self, id: int) -> Optional[FakeRole]:
+        return next((r for r in self.roles if r.id == id), None)
+
+    def get_channel(self, id: int) -> Optional[FakeChannel]:
+        return next((c for c in self.channels if c.id == id), None)
+
+
+class FakeMessage:
+    def __init__(self, guild: FakeGuild, channel: FakeChannel, author: FakeMember, content: str):
+        self.id = next_id()
+        self.guild = guild
+        self.channel = channel
+        self.author = author
+        self.content = content
+        self.clean_content = content
+        self.created_at = datetime.datetime.now(datetime.timezone.utc)
+        self.edited_at = None
+        self.jump_url = f"https://discord.com/channels/{guild.id}/{channel.id}/{self.id}"
+        self.attachments = []
+        self.embeds = []
+        self.stickers = []
+
+
+class FakeBot:
+    """Just enough of Red's bot for the cogs to run."""
+
+    def __init__(self, prefixes: Optional[List[str]] = None):
+        self.prefixes = prefixes or ["!"]
+        self.listeners = {}
+
+    async def cog_disabled_in_guild(self, cog, guild) -> bool:
+        return False
+
+    async def get_prefix(self, message) -> List[str]:
+        return self.prefixes
+
+    async def is_automod_immune(self, message) -> bool:
+        return False
+
+    def add_listener(self, func, name: str):
+        self.listeners.setdefault(name, []).append(func)
+
+    def remove_listener(self, func, name: str):
+        if func in self.listeners.get(name, []):
+            self.listeners[name].remove(func)
+
+
+def build_guild(
+    layer: SendLayer,
+    members: int = 200,
+    role_size: int = 50,
+    channels: int = 5,
+    seed: int = 0,
+) -> FakeGuild:
+    """Make a server with members, one notification role, and some text channels.
+
+    :param layer: Where sends go.
+    :param members: How many members the server has.
+    :param role_size: How many of them have the notification role.
+    :param channels: How many text channels there are.
+    :param seed: Random seed so runs are comparable.
+    """
+    rng = random.Random(seed)
+    guild = FakeGuild("Benchmark Server")
+    role = FakeRole(guild, "notify")
+    guild.roles.append(role)
+    guild.members = [FakeMember(guild, f"member{i}", layer) for i in range(members)]
+    for member in rng.sample(guild.members, min(role_size, members)):
+        member.roles.append(role)
+    guild.channels = [FakeChannel(guild, f"channel-{i}", layer) for i in range(channels)]
+    return guild
@@ -0,0 +1,213 @@
+import asyncio
+import concurrent.futures
+import hashlib
+import logging
+import os
+import pathlib
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+import aiohttp
+import discord
+
+# Called with (sha256 hex digest, size in bytes) once an attachment is stored.
+Stored = Callable[[str, int], Awaitable]
+
+
+class BlobStore:
+    """Content addressed storage for message attachments, with a byte quota per server.
+
+    Attachments are streamed to disk in chunks by background tasks, a few at a time, hashing as they go. Each file
+    ends up at `blobs/{guild ID}/{sha256[:2]}/{sha256}`, so an image posted a hundred times is only kept once. When a
+    server goes over its quota the least recently stored or reposted blobs are deleted first.
+
+    File operations happen on a dedicated thread so they stay in order and never block the event loop. Quota
+    accounting and eviction happen there too, in the same step as moving a download into place, so a repost can't
+    find a blob that another capture has already decided to delete.
+    """
+
+    def __init__(
+        self,
+        folder: pathlib.Path,
+        concurrency: int = 4,
+        max_pending: int = 500,
+        chunk_size: int = 64 * 1024,
+    ):
+        """
+        :param folder: The cog's data folder. Blobs go in a blobs folder under it.
+        :type folder: pathlib.Path
+        :param concurrency: How many attachments can download at once.
+        :type concurrency: int
+        :param max_pending: How many attachments can wait to download before new ones are dropped.
+        :type max_pending: int
+        :param chunk_size: How many bytes to read and write at a time.
+        :type chunk_size: int
+        """
+        self.folder = folder / "blobs"
+        self.max_pending = max_pending
+        self.chunk_size = chunk_size
+        self.stored = 0
+        self.deduplicated = 0
+        self.evicted = 0
+        self.dropped = 0
+        self.failed = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks: Set[asyncio.Task] = set()
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Guild ID -> digest -> size, least recently used first. Loaded from disk the first time a server is used.
+        # Only touched on the file thread.
+        self._usage: Dict[int, "OrderedDict[str, int]"] = {}
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="recorder-blobs"
+        )
+
+    @property
+    def pending(self) -> int:
+        """How many attachments are waiting or downloading."""
+        return len(self._tasks)
+
+    def capture(self, guild_id: int, attachment: discord.Attachment, quota: int, stored: Stored) -> bool:
+        """Queue an attachment to be downloaded and stored in the background.
+
+        :param guild_id: The server the attachment was posted in.
+        :type guild_id: int
+        :param attachment: The attachment.
+        :type attachment: discord.Attachment
+        :param quota: The most bytes of blobs the server can keep.
+        :type quota: int
+        :param stored: Called once the attachment is on disk.
+        :type stored: Stored
+        :return: False if it was dropped because it's bigger than the quota or too much is already queued.
+        :rtype: bool
+        """
+        if attachment.size > quota or len(self._tasks) >= self.max_pending:
+            self.dropped += 1
+            logging.warning(f"Skipped capturing attachment {attachment.id} ({attachment.size} bytes).")
+            return False
+        task = asyncio.create_task(self._capture(guild_id, attachment, quota, stored))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def close(self):
+        """Stop any downloads still in progress and release the HTTP session and file thread."""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+
+    async def _run_in_executor(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def _capture(self, guild_id: int, attachment: discord.Attachment, quota: int, stored: Stored):
+        guild_folder = self.folder / str(guild_id)
+        part = guild_folder / f".{attachment.id}.part"
+        try:
+            async with self._semaphore:
+                if self._session is None:
+                    self._session = aiohttp.ClientSession()
+                digest, size = await self._download(attachment.url, part)
+                new, evicted = await self._run_in_executor(self._store, guild_id, part, digest, size, quota)
+            if new:
+                self.stored += 1
+            else:
+                self.deduplicated += 1
+            self.evicted += evicted
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            logging.error(f"EXCEPTION {e}\n  Couldn't capture attachment {attachment.id}.")
+            return
+        finally:
+            if part.exists():
+                part.unlink()
+        await stored(digest, size)
+
+    async def _download(self, url: str, part: pathlib.Path):
+        hasher = hashlib.sha256()
+        size = 0
+        await self._run_in_executor(part.parent.mkdir, 0o777, True, True)
+        file = await self._run_in_executor(open, part, "wb")
+        try:
+            async with self._session.get(url) as response:
+                response.raise_for_status()
+                async for chunk in response.content.iter_chunked(self.chunk_size):
+                    hasher.update(chunk)
+                    size += len(chunk)
+                    await self._run_in_executor(file.write, chunk)
+        finally:
+            await self._run_in_executor(file.close)
+        return hasher.hexdigest(), size
+
+    def _store(self, guild_id: int, part: pathlib.Path, digest: str, size: int, quota: int) -> Tuple[bool, int]:
+        """Move a download into place, mark it as the most recently used and delete the oldest blobs if the server is
+        over its quota. Runs in the executor, so only one of these is ever happening at a time.
+
+        :return: Whether the blob is new, and how many blobs were evicted.
+        :rtype: Tuple[bool, int]
+        """
+        guild_folder = self.folder / str(guild_id)
+        usage = self._usage.get(guild_id)
+        if usage is None:
+            usage = self._usage[guild_id] = _scan(guild_folder)
+        new = _finish(part, guild_folder, digest)
+        usage[digest] = size
+        usage.move_to_end(digest)
+        total = sum(usage.values())
+        victims = []
+        # Never evict the blob that was just stored.
+        while total > quota and len(usage) > 1:
+            victim, victim_size = usage.popitem(last=False)
+            total -= victim_size
+            victims.append(victim)
+        _remove(guild_folder, victims)
+        return new, len(victims)
+
+
+def blob_path(guild_folder: pathlib.Path, digest: str) -> pathlib.Path:
+    """Get where a blob lives.
+
+    :param guild_folder: The server's blob folder.
+    :type guild_folder: pathlib.Path
+    :param digest: The blob's sha256 hex digest.
+    :type digest: str
+    :return: The path, fanned out by the first two characters of the digest.
+    :rtype: pathlib.Path
+    """
+    return guild_folder / digest[:2] / digest
+
+
+def _finish(part: pathlib.Path, guild_folder: pathlib.Path, digest: str) -> bool:
+    """Move a download into place, or refresh the existing copy if it's a repost. Runs in the executor."""
+    path = blob_path(guild_folder, digest)
+    if path.exists():
+        # Bump the modification time so the LRU order survives a restart.
+        os.utime(path)
+        part.unlink()
+        return False
+    path.parent.mkdir(exist_ok=True)
+    os.replace(part, path)
+    return True
+
+
+def _scan(guild_folder: pathlib.Path) -> "OrderedDict[str, int]":
+    """Load a server's blobs oldest first. Runs in the executor."""
+    blobs = []
+    if guild_folder.is_dir():
+        for path in guild_folder.glob("??/*"):
+            stat = path.stat()
+            blobs.append((stat.st_mtime, path.name, stat.st_size))
+    blobs.sort()
+    return OrderedDict((name, size) for _, name, size in blobs)
+
+
+def _remove(guild_folder: pathlib.Path, digests: list):
+    """Delete evicted blobs. Runs in the executor."""
+    for digest in digests:
+        try:
+            blob_path(guild_folder, digest).unlink()
+        except OSError as e:
+            logging.error(f"EXCEPTION {e}\n  Couldn't delete blob {digest}.")
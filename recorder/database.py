@@ -0,0 +1,478 @@
+import asyncio
+import concurrent.futures
+import datetime
+import json
+import logging
+import pathlib
+import re
+import sqlite3
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from .rotation import legacy_source, segment_date
+from .search import Query, iter_segment, render_record, server_segments
+from .stats import Metrics
+
+# How often old rows are pruned, in seconds.
+PRUNE_INTERVAL = 3600
+# Record keys that have their own column. Anything else goes in the extra JSON column.
+_COLUMNS = ("id", "ts", "edit", "channel_id", "channel", "author_id", "author", "content")
+# A row ready to insert: (message ID, channel ID, channel, author ID, author, created_at, kind, content, extra).
+Row = Tuple[Optional[int], Optional[int], str, Optional[int], str, float, str, Optional[str], Optional[str]]
+# created_at | #channel | @author :: content
+_TEXT_LINE = re.compile(r"^(.+?) \| #(.*?) \| @(.*?) :: (.*)$", re.DOTALL)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    rowid INTEGER PRIMARY KEY,
+    message_id INTEGER,
+    channel_id INTEGER,
+    channel TEXT NOT NULL,
+    author_id INTEGER,
+    author TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    kind TEXT NOT NULL,
+    content TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_channel_time ON messages (channel_id, created_at);
+CREATE INDEX IF NOT EXISTS messages_author ON messages (author_id);
+CREATE INDEX IF NOT EXISTS messages_message ON messages (message_id);
+CREATE TABLE IF NOT EXISTS migrated (path TEXT PRIMARY KEY);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(content, content='messages', content_rowid='rowid');
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, content) VALUES (new.rowid, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+END;
+"""
+
+DROP_FTS = """
+DROP TRIGGER IF EXISTS messages_fts_insert;
+DROP TRIGGER IF EXISTS messages_fts_delete;
+DROP TABLE IF EXISTS messages_fts;
+"""
+
+
+def database_path(folder: pathlib.Path, guild_id: int) -> pathlib.Path:
+    """Get where a server's database lives.
+
+    :param folder: The cog's data folder.
+    :type folder: pathlib.Path
+    :param guild_id: The server ID.
+    :type guild_id: int
+    :return: The path, like `recorder.{guild ID}.sqlite3`.
+    :rtype: pathlib.Path
+    """
+    return folder / f"recorder.{guild_id}.sqlite3"
+
+
+def to_row(record: dict, timestamp: float) -> Row:
+    """Turn a structured record into a database row.
+
+    :param record: The record, as built by the *_fields functions in formats.
+    :type record: dict
+    :param timestamp: The record's time.
+    :type timestamp: float
+    :return: The row.
+    :rtype: Row
+    """
+    if record.get("deleted"):
+        kind = "delete"
+    elif "blob" in record:
+        kind = "attachment"
+    elif record.get("edit"):
+        kind = "edit"
+    else:
+        kind = "message"
+    extra = {key: value for key, value in record.items() if key not in _COLUMNS and key != "deleted"}
+    return (
+        record["id"],
+        record["channel_id"],
+        record["channel"],
+        record["author_id"],
+        record["author"],
+        timestamp,
+        kind,
+        record.get("content"),
+        json.dumps(extra, ensure_ascii=False) if extra else None,
+    )
+
+
+def _connect(path: pathlib.Path) -> sqlite3.Connection:
+    connection = sqlite3.connect(path, isolation_level=None)
+    connection.execute("PRAGMA journal_mode=WAL")
+    # Migrations write from another thread, so wait for their transactions instead of failing.
+    connection.execute("PRAGMA busy_timeout=10000")
+    # With WAL, NORMAL only risks the last transactions on power loss, never corruption.
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+class DatabaseWriter:
+    """Writes records to one SQLite database per server.
+
+    Rows are queued and inserted in batches, one transaction per server per batch, on a dedicated thread that owns
+    every connection. Databases use WAL so searches can read while the writer is busy.
+    """
+
+    def __init__(
+        self,
+        folder: pathlib.Path,
+        max_queue: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        metrics: Optional[Metrics] = None,
+    ):
+        """
+        :param folder: The folder databases are kept in.
+        :type folder: pathlib.Path
+        :param max_queue: How many rows can be waiting before writers have to wait for room.
+        :type max_queue: int
+        :param batch_size: How many rows to collect before forcing a flush.
+        :type batch_size: int
+        :param flush_interval: The longest a row should sit in memory before being written, in seconds.
+        :type flush_interval: float
+        :param metrics: Where to record flush timings, if anywhere.
+        :type metrics: Optional[Metrics]
+        """
+        self.folder = folder
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.metrics = metrics or Metrics("recorder_database")
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._task = None
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="recorder-sqlite"
+        )
+        # Only touched from the executor thread.
+        self._connections: Dict[int, sqlite3.Connection] = {}
+        # Guild ID -> days of logs to keep, 0 for forever.
+        self._retention: Dict[int, int] = {}
+
+    @property
+    def queue_depth(self) -> int:
+        """How many rows are waiting to be written."""
+        return self._queue.qsize()
+
+    def start(self):
+        """Start the background task."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def write(self, guild_id: int, record: dict, timestamp: float, retention_days: int = 0):
+        """Queue a record to be written. Only waits if the queue is full.
+
+        :param guild_id: The server ID.
+        :type guild_id: int
+        :param record: The record, as built by the *_fields functions in formats.
+        :type record: dict
+        :param timestamp: The record's time.
+        :type timestamp: float
+        :param retention_days: Delete rows older than this many days. 0 keeps everything.
+        :type retention_days: int
+        """
+        self._retention[guild_id] = retention_days
+        await self._queue.put((guild_id, to_row(record, timestamp)))
+
+    async def close(self):
+        """Stop the background task, write out anything still queued, and close every database."""
+        if self._task is not None:
+            await self._queue.put(None)
+            await self._task
+            self._task = None
+        await self._run_in_executor(self._close_all)
+        self._executor.shutdown(wait=True)
+
+    async def set_fts(self, guild_id: int, enabled: bool):
+        """Add or remove a server's full text index. Adding one indexes everything already stored.
+
+        :param guild_id: The server ID.
+        :type guild_id: int
+        :param enabled: Whether the server should have one.
+        :type enabled: bool
+        :raises sqlite3.OperationalError: If this SQLite wasn't built with FTS5.
+        """
+        await self._run_in_executor(self._set_fts, guild_id, enabled)
+
+    async def migrate(self, guild_id: int, server: str, channel_ids: Dict[str, int], author_ids: Dict[str, int]):
+        """Copy a server's existing log files into its database. Files already copied are skipped.
+
+        This runs on its own connection and thread, committing a batch at a time, so live writes carry on meanwhile.
+
+        :param guild_id: The server ID.
+        :type guild_id: int
+        :param server: The server name the logs were written under.
+        :type server: str
+        :param channel_ids: Channel name -> ID, since text logs only have names.
+        :type channel_ids: Dict[str, int]
+        :param author_ids: Username -> ID, since text logs only have names.
+        :type author_ids: Dict[str, int]
+        :return: How many files and rows were copied.
+        :rtype: Tuple[int, int]
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self._migrate, guild_id, server, channel_ids, author_ids
+        )
+
+    async def _run_in_executor(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def _run(self):
+        batch: Dict[int, List[Row]] = {}
+        pending = 0
+        deadline = time.monotonic() + self.flush_interval
+        next_prune = time.monotonic()
+        while True:
+            timeout = max(deadline - time.monotonic(), 0)
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                item = ()
+            if item is None:
+                await self._flush(batch)
+                return
+            if item:
+                guild_id, row = item
+                batch.setdefault(guild_id, []).append(row)
+                pending += 1
+            if pending >= self.batch_size or time.monotonic() >= deadline:
+                await self._flush(batch)
+                batch = {}
+                pending = 0
+                deadline = time.monotonic() + self.flush_interval
+            if time.monotonic() >= next_prune:
+                try:
+                    await self._run_in_executor(self._prune, dict(self._retention))
+                except sqlite3.Error as e:
+                    logging.error(f"EXCEPTION {e}\n  Failed pruning recorder databases.")
+                next_prune = time.monotonic() + PRUNE_INTERVAL
+
+    async def _flush(self, batch: Dict[int, List[Row]]):
+        if not batch:
+            return
+        try:
+            with self.metrics.timer("db_flush"):
+                written, failed = await self._run_in_executor(self._write_batch, batch)
+            self.metrics.inc("db_rows_written", written)
+            if failed:
+                self.metrics.inc("db_flush_errors", failed)
+        except Exception as e:
+            self.metrics.inc("db_flush_errors")
+            logging.error(f"EXCEPTION {e}\n  Failed writing {len(batch)} recorder databases.")
+
+    def _connection(self, guild_id: int) -> sqlite3.Connection:
+        """Runs in the executor."""
+        connection = self._connections.get(guild_id)
+        if connection is None:
+            connection = self._connections[guild_id] = _connect(database_path(self.folder, guild_id))
+        return connection
+
+    def _write_batch(self, batch: Dict[int, List[Row]]) -> Tuple[int, int]:
+        """Runs in the executor. Returns how many rows were written and how many servers failed.
+
+        A database that can't be written only loses its own rows, not the rest of the batch.
+        """
+        written = failed = 0
+        for guild_id, rows in batch.items():
+            try:
+                connection = self._connection(guild_id)
+                with connection:
+                    connection.execute("BEGIN")
+                    _insert(connection, rows)
+                written += len(rows)
+            except sqlite3.Error as e:
+                failed += 1
+                logging.error(f"EXCEPTION {e}\n  Failed writing {len(rows)} rows to recorder database {guild_id}.")
+                # Reconnect next time in case the connection itself is what's broken.
+                connection = self._connections.pop(guild_id, None)
+                if connection is not None:
+                    connection.close()
+        return written, failed
+
+    def _prune(self, retention: Dict[int, int]):
+        """Runs in the executor."""
+        now = time.time()
+        for guild_id, days in retention.items():
+            if days:
+                connection = self._connection(guild_id)
+                with connection:
+                    connection.execute("BEGIN")
+                    connection.execute("DELETE FROM messages WHERE created_at < ?", (now - days * 86400,))
+
+    def _set_fts(self, guild_id: int, enabled: bool):
+        """Runs in the executor."""
+        connection = self._connection(guild_id)
+        if enabled:
+            connection.executescript(FTS_SCHEMA)
+            connection.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+        else:
+            connection.executescript(DROP_FTS)
+
+    def _migrate(self, guild_id: int, server: str, channel_ids: Dict[str, int], author_ids: Dict[str, int]):
+        """Runs in the default executor with its own connection."""
+        connection = _connect(database_path(self.folder, guild_id))
+        try:
+            done = {_migrated_name(path) for (path,) in connection.execute("SELECT path FROM migrated")}
+            today = datetime.datetime.now(datetime.timezone.utc).date()
+            files = rows = 0
+            for path in server_segments(self.folder, server):
+                if _migrated_name(path.name) in done or legacy_source(path) in done:
+                    continue
+                # Today's segments are still being written to, so they wait for a later run. Undated logs from before
+                # rotation have no date and aren't written to anymore.
+                date = segment_date(path)
+                if date is not None and date >= today:
+                    continue
+                parse = _parse_jsonl if ".jsonl" in path.suffixes else _parse_text
+                batch = []
+                for row in parse(iter_segment(path), channel_ids, author_ids):
+                    batch.append(row)
+                    if len(batch) >= self.batch_size:
+                        rows += self._insert_batch(connection, batch)
+                        batch = []
+                # The file is only marked done with its last batch. If the bot stops partway through a file, the
+                # next run copies all of it again.
+                rows += self._insert_batch(connection, batch, _migrated_name(path.name))
+                files += 1
+            return files, rows
+        finally:
+            connection.close()
+
+    def _insert_batch(self, connection: sqlite3.Connection, rows: List[Row], migrated: Optional[str] = None) -> int:
+        with connection:
+            connection.execute("BEGIN")
+            _insert(connection, rows)
+            if migrated is not None:
+                connection.execute("INSERT INTO migrated (path) VALUES (?)", (migrated,))
+        return len(rows)
+
+    def _close_all(self):
+        """Runs in the executor."""
+        for connection in self._connections.values():
+            connection.close()
+        self._connections.clear()
+
+
+def _migrated_name(name: str) -> str:
+    """Get the name a segment is marked migrated under, the same before and after it's compressed."""
+    for suffix in (".gz", ".zst"):
+        if name.endswith(suffix):
+            return name[: -len(suffix)]
+    return name
+
+
+def _insert(connection: sqlite3.Connection, rows: List[Row]) -> int:
+    connection.executemany(
+        "INSERT INTO messages (message_id, channel_id, channel, author_id, author, created_at, kind, content, extra) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    return len(rows)
+
+
+def _parse_jsonl(lines: Iterable[bytes], channel_ids: Dict[str, int], author_ids: Dict[str, int]) -> Iterator[Row]:
+    for line in lines:
+        try:
+            record = json.loads(line)
+            timestamp = datetime.datetime.fromisoformat(record["ts"]).timestamp()
+            yield to_row(record, timestamp)
+        except (ValueError, KeyError):
+            continue
+
+
+def _parse_text(lines: Iterable[bytes], channel_ids: Dict[str, int], author_ids: Dict[str, int]) -> Iterator[Row]:
+    current = None
+    for raw in lines:
+        line = raw.decode("utf-8", errors="replace").rstrip("\n")
+        match = _TEXT_LINE.match(line)
+        timestamp = None
+        if match:
+            try:
+                timestamp = datetime.datetime.fromisoformat(match.group(1)).timestamp()
+            except ValueError:
+                pass
+        if timestamp is None:
+            # Lines without a timestamp belong to the message before them.
+            if current is not None:
+                current[7] = (current[7] or "") + "\n" + line
+            continue
+        if current is not None:
+            yield tuple(current)
+        _, channel, author, content = match.groups()
+        if content.startswith("*deleted* "):
+            kind = "delete"
+            # Stored without the marker, like live deletions, since rendering adds it back.
+            content = content[len("*deleted* ") :]
+            if content == "(content not cached)":
+                content = None
+        elif content.startswith("*attachment* "):
+            kind = "attachment"
+        elif content.startswith("*edit* "):
+            kind = "edit"
+        else:
+            kind = "message"
+        username = author.split("/", 1)[-1].rsplit("#", 1)[0]
+        current = [
+            None,
+            channel_ids.get(channel),
+            channel,
+            author_ids.get(username),
+            author,
+            timestamp,
+            kind,
+            content,
+            None,
+        ]
+    if current is not None:
+        yield tuple(current)
+
+
+def search_database(path: pathlib.Path, query: Query, text: Optional[str] = None) -> Iterator[str]:
+    """Stream every stored message matching a query, formatted like text log lines.
+
+    This does blocking I/O, so run it in an executor.
+
+    :param path: The server's database.
+    :type path: pathlib.Path
+    :param query: The search. Uses the channel and author IDs, or names for rows migrated without IDs.
+    :type query: Query
+    :param text: Full text search terms, if any. Needs the server's full text index.
+    :type text: Optional[str]
+    :return: Matching messages in time order.
+    :rtype: Iterator[str]
+    """
+    if not path.exists():
+        return
+    sql = "SELECT m.created_at, m.channel, m.author, m.kind, m.content, m.extra FROM messages m"
+    conditions = ["m.created_at BETWEEN ? AND ?"]
+    params: list = [query.start, query.end]
+    if text:
+        sql += " JOIN messages_fts ON messages_fts.rowid = m.rowid"
+        conditions.append("messages_fts MATCH ?")
+        params.append(text)
+    if query.channel_id is not None:
+        conditions.append("(m.channel_id = ? OR (m.channel_id IS NULL AND m.channel = ?))")
+        params += [query.channel_id, query.channel]
+    if query.author_id is not None:
+        conditions.append("(m.author_id = ? OR (m.author_id IS NULL AND m.author LIKE ?))")
+        params += [query.author_id, f"%/{query.author_name}#%"]
+    sql += " WHERE " + " AND ".join(conditions) + " ORDER BY m.created_at"
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        for created_at, channel, author, kind, content, extra in connection.execute(sql, params):
+            record = json.loads(extra) if extra else {}
+            record.update(
+                ts=datetime.datetime.fromtimestamp(created_at, datetime.timezone.utc).isoformat(),
+                channel=channel,
+                author=author,
+                content=content,
+                deleted=kind == "delete",
+            )
+            yield render_record(record)
+    finally:
+        connection.close()
@@ -0,0 +1,357 @@
+import datetime
+import difflib
+import json
+import pathlib
+import re
+import struct
+from typing import Iterator, List, Optional, Tuple, Union
+import discord
+
+FORMATS = ("text", "jsonl", "sqlite")
+# Each index entry is (byte offset into the segment, unix timestamp, message ID).
+INDEX_ENTRY = struct.Struct("<QdQ")
+# A change to a message's content: (position in the old content, text removed there, text inserted there).
+DiffOp = Tuple[int, str, str]
+# Words, runs of whitespace, and single symbols. Together they always cover the whole string.
+_TOKEN = re.compile(r"\w+|\s+|[^\w\s]", re.DOTALL)
+
+
+def author_tag(author: Union[discord.Member, discord.User]) -> str:
+    """Format an author the way every record names them.
+
+    :param author: The author.
+    :type author: Union[discord.Member, discord.User]
+    :return: display name/username#discriminator
+    :rtype: str
+    """
+    return f"{author.display_name}/{author.name}#{author.discriminator}"
+
+
+def text_record(
+    message: discord.Message, content: str, edit: bool = False, capture: bool = False
+) -> str:
+    """Format a message as a plain text log line.
+
+    :param message: The message.
+    :type message: discord.Message
+    :param content: The message's clean content.
+    :type content: str
+    :param edit: Whether this is an edit of an earlier message.
+    :type edit: bool
+    :param capture: Whether to note attachments, embeds, and stickers after the content.
+    :type capture: bool
+    :return: The log line, including the trailing newline.
+    :rtype: str
+    """
+    if edit:
+        content = f"*edit* {content}"
+    if capture:
+        content += "".join(
+            [f" [attachment {a.id}: {a.filename}, {a.size} bytes]" for a in message.attachments]
+            + [f" [embed: {e.title or e.url or e.type}]" for e in message.embeds]
+            + [f" [sticker: {s.name}]" for s in message.stickers]
+        )
+    return f"{message.created_at} | #{message.channel.name} | @{author_tag(message.author)} :: {content}\n"
+
+
+def message_fields(
+    message: discord.Message, content: str, edit: bool = False, capture: bool = False
+) -> Tuple[dict, float]:
+    """Build the structured record for a message, as written to JSON logs and the database.
+
+    :param message: The message.
+    :type message: discord.Message
+    :param content: The message's clean content.
+    :type content: str
+    :param edit: Whether this is an edit of an earlier message.
+    :type edit: bool
+    :param capture: Whether to include attachments, embeds, and stickers.
+    :type capture: bool
+    :return: The record and the timestamp it's indexed under.
+    :rtype: Tuple[dict, float]
+    """
+    time = (message.edited_at if edit else None) or message.created_at
+    record = {
+        "id": message.id,
+        "ts": time.isoformat(),
+        "edit": edit,
+        "channel_id": message.channel.id,
+        "channel": message.channel.name,
+        "author_id": message.author.id,
+        "author": author_tag(message.author),
+        "content": content,
+    }
+    if capture:
+        if message.attachments:
+            record["attachments"] = [
+                {"id": a.id, "filename": a.filename, "size": a.size, "content_type": a.content_type}
+                for a in message.attachments
+            ]
+        if message.embeds:
+            record["embeds"] = [embed.to_dict() for embed in message.embeds]
+        if message.stickers:
+            record["stickers"] = [{"id": s.id, "name": s.name} for s in message.stickers]
+    return record, time.timestamp()
+
+
+def json_record(
+    message: discord.Message, content: str, edit: bool = False, capture: bool = False
+) -> Tuple[str, float]:
+    """Format a message as a JSON line. See message_fields() for the arguments.
+
+    Unlike the text format, content with newlines or separators can't break the framing.
+
+    :return: The JSON line, including the trailing newline, and the timestamp it's indexed under.
+    :rtype: Tuple[str, float]
+    """
+    return dump_record(*message_fields(message, content, edit, capture))
+
+
+def dump_record(record: dict, timestamp: float) -> Tuple[str, float]:
+    """Serialize a structured record as a JSON line.
+
+    :param record: The record.
+    :type record: dict
+    :param timestamp: The timestamp it's indexed under.
+    :type timestamp: float
+    :return: The JSON line, including the trailing newline, and the timestamp.
+    :rtype: Tuple[str, float]
+    """
+    return json.dumps(record, ensure_ascii=False) + "\n", timestamp
+
+
+def text_blob_record(
+    message: discord.Message, attachment: discord.Attachment, digest: str, size: int
+) -> str:
+    """Format a plain text log line saying where a captured attachment was stored.
+
+    These are written once the download finishes, stamped with that time so the log stays in order.
+
+    :param message: The message the attachment came with.
+    :type message: discord.Message
+    :param attachment: The attachment.
+    :type attachment: discord.Attachment
+    :param digest: The sha256 hex digest it's stored under.
+    :type digest: str
+    :param size: Its size in bytes.
+    :type size: int
+    :return: The log line, including the trailing newline.
+    :rtype: str
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return (
+        f"{now} | #{message.channel.name} | @{author_tag(message.author)} :: "
+        f"*attachment* {attachment.id} {attachment.filename} sha256:{digest} ({size} bytes) on message {message.id}\n"
+    )
+
+
+def blob_fields(
+    message: discord.Message, attachment: discord.Attachment, digest: str, size: int
+) -> Tuple[dict, float]:
+    """Build the structured record saying where a captured attachment was stored. See text_blob_record().
+
+    :param message: The message the attachment came with.
+    :type message: discord.Message
+    :param attachment: The attachment.
+    :type attachment: discord.Attachment
+    :param digest: The sha256 hex digest it's stored under.
+    :type digest: str
+    :param size: Its size in bytes.
+    :type size: int
+    :return: The record and the timestamp it's indexed under.
+    :rtype: Tuple[dict, float]
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    record = {
+        "id": message.id,
+        "ts": now.isoformat(),
+        "edit": False,
+        "channel_id": message.channel.id,
+        "channel": message.channel.name,
+        "author_id": message.author.id,
+        "author": author_tag(message.author),
+        "content": f"*attachment* {attachment.filename} sha256:{digest}",
+        "blob": {"attachment_id": attachment.id, "filename": attachment.filename, "sha256": digest, "size": size},
+    }
+    return record, now.timestamp()
+
+
+def diff_ops(old: str, new: str) -> List[DiffOp]:
+    """Work out the smallest set of changes that turns one version of a message into another.
+
+    :param old: The content as last logged.
+    :type old: str
+    :param new: The edited content.
+    :type new: str
+    :return: The changes, in order. Empty if nothing changed.
+    :rtype: List[DiffOp]
+    """
+    # Diffing whole words rather than characters keeps the changes readable.
+    old_tokens = _TOKEN.findall(old)
+    new_tokens = _TOKEN.findall(new)
+    positions = [0]
+    for token in old_tokens:
+        positions.append(positions[-1] + len(token))
+    matcher = difflib.SequenceMatcher(None, old_tokens, new_tokens, autojunk=False)
+    return [
+        (positions[i1], "".join(old_tokens[i1:i2]), "".join(new_tokens[j1:j2]))
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != "equal"
+    ]
+
+
+def apply_diff(old: str, ops: List[DiffOp]) -> str:
+    """Rebuild edited content from the previous version and a logged diff.
+
+    :param old: The previous content.
+    :type old: str
+    :param ops: The diff, as diff_ops() made it or as read back from a jsonl record.
+    :type ops: List[DiffOp]
+    :return: The edited content.
+    :rtype: str
+    """
+    # Working backwards keeps earlier positions valid.
+    for start, removed, inserted in reversed(ops):
+        old = old[:start] + inserted + old[start + len(removed) :]
+    return old
+
+
+def render_diff(ops: List[DiffOp]) -> str:
+    """Format a diff for text logs and search results, like `@12 -"wifi" +"network"`.
+
+    :param ops: The diff.
+    :type ops: List[DiffOp]
+    :return: One @position -removed +inserted entry per change.
+    :rtype: str
+    """
+    return " ".join(
+        f"@{start} -{json.dumps(removed, ensure_ascii=False)} +{json.dumps(inserted, ensure_ascii=False)}"
+        for start, removed, inserted in ops
+    )
+
+
+def text_change_record(created_at: datetime.datetime, channel: str, author: str, change: str) -> str:
+    """Format a plain text log line for an edit or deletion that isn't a full copy of a message.
+
+    Like full edits, these are stamped with when the message was first sent so they line up with the original.
+
+    :param created_at: When the message was sent.
+    :type created_at: datetime.datetime
+    :param channel: The channel name.
+    :type channel: str
+    :param author: The author, as author_tag() formats them.
+    :type author: str
+    :param change: What happened, like `*deleted* hello`.
+    :type change: str
+    :return: The log line, including the trailing newline.
+    :rtype: str
+    """
+    return f"{created_at} | #{channel} | @{author} :: {change}\n"
+
+
+def change_fields(
+    message_id: int,
+    time: datetime.datetime,
+    channel_id: int,
+    channel: str,
+    author_id: Optional[int],
+    author: str,
+    **change,
+) -> Tuple[dict, float]:
+    """Build the structured record for an edit or deletion that isn't a full copy of a message.
+
+    :param message_id: The message ID.
+    :type message_id: int
+    :param time: When the change happened.
+    :type time: datetime.datetime
+    :param channel_id: The channel ID.
+    :type channel_id: int
+    :param channel: The channel name.
+    :type channel: str
+    :param author_id: The author's ID, if known.
+    :type author_id: Optional[int]
+    :param author: The author, as author_tag() formats them.
+    :type author: str
+    :param change: The rest of the record, like `edit=True, diff=[...]` or `deleted=True, content="..."`.
+    :return: The record and the timestamp it's indexed under.
+    :rtype: Tuple[dict, float]
+    """
+    record = {
+        "id": message_id,
+        "ts": time.isoformat(),
+        "edit": False,
+        "channel_id": channel_id,
+        "channel": channel,
+        "author_id": author_id,
+        "author": author,
+    }
+    record.update(change)
+    return record, time.timestamp()
+
+
+def index_path(segment: pathlib.Path) -> pathlib.Path:
+    """Get the sidecar index for a segment.
+
+    :param segment: The segment path, compressed or not.
+    :type segment: pathlib.Path
+    :return: The index path, like `recorder.{server}.{channel}.2026-10-18.jsonl.idx`.
+    :rtype: pathlib.Path
+    """
+    name = segment.name
+    for ext in (".gz", ".zst"):
+        if name.endswith(ext):
+            name = name[: -len(ext)]
+    return segment.with_name(name + ".idx")
+
+
+def iter_index(data: bytes) -> Iterator[Tuple[int, float, int]]:
+    """Walk the entries of an index.
+
+    :param data: The raw index, or a memory map of it.
+    :type data: bytes
+    :return: (offset, timestamp, message ID) for every entry.
+    :rtype: Iterator[Tuple[int, float, int]]
+    """
+    usable = len(data) - len(data) % INDEX_ENTRY.size
+    return INDEX_ENTRY.iter_unpack(memoryview(data)[:usable])
+
+
+def find_offset(data: bytes, timestamp: float) -> Optional[int]:
+    """Binary search an index for the first record at or after a time.
+
+    Entries are written in the order messages arrive, so timestamps are effectively sorted within a segment.
+
+    :param data: The raw index, or a memory map of it.
+    :type data: bytes
+    :param timestamp: The unix timestamp to seek to.
+    :type timestamp: float
+    :return: The byte offset of the first record at or after the time, or None if every record is earlier.
+    :rtype: Optional[int]
+    """
+    low, high = 0, len(data) // INDEX_ENTRY.size
+    while low < high:
+        mid = (low + high) // 2
+        if INDEX_ENTRY.unpack_from(data, mid * INDEX_ENTRY.size)[1] < timestamp:
+            low = mid + 1
+        else:
+            high = mid
+    if low == len(data) // INDEX_ENTRY.size:
+        return None
+    return INDEX_ENTRY.unpack_from(data, low * INDEX_ENTRY.size)[0]
+
+
+def find_message(data: bytes, message_id: int) -> Optional[int]:
+    """Look up where a message's most recent record is in a segment.
+
+    :param data: The raw index, or a memory map of it.
+    :type data: bytes
+    :param message_id: The message ID.
+    :type message_id: int
+    :return: The byte offset of the last record for the message, or None if it isn't in the segment.
+    :rtype: Optional[int]
+    """
+    found = None
+    for offset, _, entry_id in iter_index(data):
+        if entry_id == message_id:
+            found = offset
+    return found
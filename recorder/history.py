@@ -0,0 +1,79 @@
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+
+class Logged(NamedTuple):
+    # The content as it was last written to the log, which edits are diffed against.
+    content: str
+    author_id: int
+    # The author as the log writes them, display name/username#discriminator.
+    author: str
+
+
+class RecentMessages:
+    """What was last logged for recent messages, so edits can be logged as diffs and deletions can say what went.
+
+    Each channel keeps its most recently logged messages, and only the most recently active channels are kept.
+    """
+
+    def __init__(self, per_channel: int = 50, max_channels: int = 500):
+        """
+        :param per_channel: How many messages to remember per channel.
+        :type per_channel: int
+        :param max_channels: How many channels to remember messages for.
+        :type max_channels: int
+        """
+        self.per_channel = per_channel
+        self.max_channels = max_channels
+        self._channels: "OrderedDict[int, OrderedDict[int, Logged]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return sum(len(messages) for messages in self._channels.values())
+
+    def get(self, channel_id: int, message_id: int) -> Optional[Logged]:
+        """Look up what was last logged for a message.
+
+        :param channel_id: The channel ID.
+        :type channel_id: int
+        :param message_id: The message ID.
+        :type message_id: int
+        :return: The logged message, or None if it's not remembered.
+        :rtype: Optional[Logged]
+        """
+        messages = self._channels.get(channel_id)
+        return messages.get(message_id) if messages is not None else None
+
+    def set(self, channel_id: int, message_id: int, logged: Logged):
+        """Remember what was logged for a message.
+
+        :param channel_id: The channel ID.
+        :type channel_id: int
+        :param message_id: The message ID.
+        :type message_id: int
+        :param logged: What was logged.
+        :type logged: Logged
+        """
+        messages = self._channels.get(channel_id)
+        if messages is None:
+            messages = self._channels[channel_id] = OrderedDict()
+            while len(self._channels) > self.max_channels:
+                self._channels.popitem(last=False)
+        else:
+            self._channels.move_to_end(channel_id)
+        messages[message_id] = logged
+        messages.move_to_end(message_id)
+        while len(messages) > self.per_channel:
+            messages.popitem(last=False)
+
+    def pop(self, channel_id: int, message_id: int) -> Optional[Logged]:
+        """Forget a message, returning what was logged for it.
+
+        :param channel_id: The channel ID.
+        :type channel_id: int
+        :param message_id: The message ID.
+        :type message_id: int
+        :return: The logged message, or None if it wasn't remembered.
+        :rtype: Optional[Logged]
+        """
+        messages = self._channels.get(channel_id)
+        return messages.pop(message_id, None) if messages is not None else None
@@ -0,0 +1,194 @@
+# This file is shared by the recorder and snitch cogs. Keep both copies identical, and bump VERSION when the
+# interface changes so cogs on different versions don't share an incompatible instance.
+import asyncio
+import functools
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+import discord
+from redbot.core import commands
+
+VERSION = 2
+# The bot attribute the shared instance hangs off of.
+_ATTR = "_brent_cogs_ingest"
+
+
+class MessageFacts:
+    """Everything about a message that more than one cog wants, worked out at most once."""
+
+    def __init__(
+        self,
+        bot,
+        message: discord.Message,
+        edit: bool = False,
+        prior: Optional[discord.Message] = None,
+    ):
+        """
+        :param bot: The bot.
+        :param message: The message.
+        :type message: discord.Message
+        :param edit: Whether this is an edit of an earlier message.
+        :type edit: bool
+        :param prior: The message before the edit, if this is one.
+        :type prior: Optional[discord.Message]
+        """
+        self.bot = bot
+        self.message = message
+        self.edit = edit
+        self.prior = prior
+        self.guild = message.guild
+        self._disabled: Dict[str, bool] = {}
+        self._is_command: Optional[bool] = None
+
+    @functools.cached_property
+    def clean_content(self) -> str:
+        """The message's clean_content, which discord.py otherwise rebuilds on every access."""
+        return self.message.clean_content
+
+    async def disabled(self, cog: commands.Cog) -> bool:
+        """Check whether a cog is disabled in the message's server.
+
+        :param cog: The cog asking.
+        :type cog: commands.Cog
+        :return: True if the cog shouldn't handle this message.
+        :rtype: bool
+        """
+        name = cog.qualified_name
+        if name not in self._disabled:
+            self._disabled[name] = await self.bot.cog_disabled_in_guild(cog, self.guild)
+        return self._disabled[name]
+
+    async def is_command(self) -> bool:
+        """Check whether the message starts with one of the bot's prefixes.
+
+        :return: True if the message looks like a command.
+        :rtype: bool
+        """
+        if self._is_command is None:
+            prefixes = await self.bot.get_prefix(self.message)
+            if isinstance(prefixes, str):
+                prefixes = [prefixes]
+            self._is_command = any(self.clean_content.startswith(p) for p in prefixes)
+        return self._is_command
+
+
+class MessageIngest:
+    """A single on_message/on_message_edit listener that hands MessageFacts to every subscribed cog.
+
+    Messages outside servers are dropped before any subscriber sees them. Facts are memoized per message (and per
+    edit) in a bounded LRU so anything that asks about the same message again gets the same answers.
+    """
+
+    version = VERSION
+
+    def __init__(self, bot, maxsize: int = 2048):
+        """
+        :param bot: The bot.
+        :param maxsize: How many messages to remember facts for.
+        :type maxsize: int
+        """
+        self.bot = bot
+        self.maxsize = maxsize
+        self._facts: "OrderedDict[tuple, MessageFacts]" = OrderedDict()
+        self._subscribers: Dict[str, Callable[[MessageFacts], Awaitable]] = {}
+
+    @classmethod
+    def attach(cls, bot) -> "MessageIngest":
+        """Get the ingest shared by every cog on this bot, creating it if needed.
+
+        :param bot: The bot.
+        :return: The shared ingest, or a private one if the shared one is from an incompatible version.
+        :rtype: MessageIngest
+        """
+        existing = getattr(bot, _ATTR, None)
+        if existing is not None and getattr(existing, "version", None) == VERSION:
+            return existing
+        ingest = cls(bot)
+        if existing is None:
+            setattr(bot, _ATTR, ingest)
+        return ingest
+
+    def subscribe(self, cog: commands.Cog, callback: Callable[[MessageFacts], Awaitable]):
+        """Start sending a cog every server message and edit.
+
+        :param cog: The subscribing cog.
+        :type cog: commands.Cog
+        :param callback: Called with the facts for each message.
+        :type callback: Callable[[MessageFacts], Awaitable]
+        """
+        if not self._subscribers:
+            self.bot.add_listener(self._on_message, "on_message")
+            self.bot.add_listener(self._on_message_edit, "on_message_edit")
+        self._subscribers[cog.qualified_name] = callback
+
+    def unsubscribe(self, cog: commands.Cog):
+        """Stop sending a cog messages. The listeners go away with the last subscriber.
+
+        :param cog: The subscribed cog.
+        :type cog: commands.Cog
+        """
+        self._subscribers.pop(cog.qualified_name, None)
+        if not self._subscribers:
+            self.bot.remove_listener(self._on_message, "on_message")
+            self.bot.remove_listener(self._on_message_edit, "on_message_edit")
+            self._facts.clear()
+            if getattr(self.bot, _ATTR, None) is self:
+                delattr(self.bot, _ATTR)
+
+    def facts(
+        self,
+        message: discord.Message,
+        edit: bool = False,
+        prior: Optional[discord.Message] = None,
+    ) -> MessageFacts:
+        """Get the facts for a message, reusing them if this message was seen recently.
+
+        :param message: The message.
+        :type message: discord.Message
+        :param edit: Whether this is an edit of an earlier message.
+        :type edit: bool
+        :param prior: The message before the edit, if this is one.
+        :type prior: Optional[discord.Message]
+        :return: The message's facts.
+        :rtype: MessageFacts
+        """
+        # Updates like link previews loading come through as edits without changing edited_at, so the edit flag has
+        # to be part of the key or they'd get the original message's facts.
+        key = (message.id, edit, message.edited_at if edit else None)
+        facts = self._facts.get(key)
+        if facts is not None:
+            self._facts.move_to_end(key)
+            return facts
+        facts = MessageFacts(self.bot, message, edit, prior)
+        self._facts[key] = facts
+        while len(self._facts) > self.maxsize:
+            self._facts.popitem(last=False)
+        return facts
+
+    async def dispatch(self, facts: MessageFacts):
+        """Hand facts to every subscriber at once. One subscriber failing doesn't affect the others.
+
+        :param facts: The message's facts.
+        :type facts: MessageFacts
+        """
+        names = list(self._subscribers)
+        results = await asyncio.gather(
+            *(self._subscribers[name](facts) for name in names), return_exceptions=True
+        )
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                logging.error(
+                    f"EXCEPTION {result}\n  {name} failed handling message {facts.message.id}.",
+                    exc_info=result,
+                )
+
+    async def _on_message(self, message: discord.Message):
+        # Everything subscribed only works in servers.
+        if message.guild is None:
+            return
+        await self.dispatch(self.facts(message))
+
+    async def _on_message_edit(self, prior: discord.Message, message: discord.Message):
+        if message.guild is None:
+            return
+        await self.dispatch(self.facts(message, edit=True, prior=prior))
@@ -1,9 +1,63 @@
 import asyncio
+import datetime
 import discord
+import functools
+import itertools
 import logging
 import pathlib
+import sqlite3
+from typing import Optional, Tuple
 from redbot.core import checks, Config, commands
 from redbot.core.data_manager import cog_data_path
+from redbot.core.utils.chat_formatting import box, pagify
+from redbot.core.utils.menus import DEFAULT_CONTROLS, menu
+from .blobs import BlobStore
+from .database import DatabaseWriter, database_path, search_database
+from .formats import (
+    FORMATS,
+    author_tag,
+    diff_ops,
+    blob_fields,
+    change_fields,
+    dump_record,
+    json_record,
+    message_fields,
+    render_diff,
+    text_blob_record,
+    text_change_record,
+    text_record,
+)
+from .history import Logged, RecentMessages
+from .ingest import MessageFacts, MessageIngest
+from .rotation import COMPRESSIONS, RotationPolicy
+from .search import Query, render_record, search
+from .stats import Metrics
+from .writer import LogWriter
+
+
+# The most results [p]recorder search will page through. Anything more should be exported.
+MAX_SEARCH_RESULTS = 500
+
+
+def _parse_time(value: str, end: bool = False) -> datetime.datetime:
+    """Parse a date or ISO time from a command argument, assuming UTC if no timezone is given.
+
+    :param value: Something like 2026-10-18 or 2026-10-18T14:30.
+    :type value: str
+    :param end: If only a date is given, use the end of that day instead of the start.
+    :type end: bool
+    :return: A timezone aware time.
+    :rtype: datetime.datetime
+    """
+    try:
+        parsed = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise commands.BadArgument(f"Couldn't read {value} as a date or time. Try 2026-10-18 or 2026-10-18T14:30.")
+    if end and len(value) == 10:
+        parsed += datetime.timedelta(days=1, microseconds=-1)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed
 
 
 class Recorder(commands.Cog):
@@ -15,45 +69,828 @@ class Recorder(commands.Cog):
         super().__init__()
         self.bot = bot
         self.config = Config.get_conf(self, identifier=675274376)
+        default_global_settings = {
+            "handle_capacity": 128,
+            "handle_idle_timeout": 300,
+            "metrics_export": False,
+        }
+        self.config.register_global(**default_global_settings)
+        default_guild_settings = {
+            "max_mb": 0,
+            "compression": "gzip",
+            "retention_days": 0,
+            "format": "text",
+            "capture": False,
+            "capture_quota_mb": 1024,
+        }
+        self.config.register_guild(**default_guild_settings)
+        self.metrics = Metrics("recorder")
+        self.writer = LogWriter(cog_data_path(cog_instance=self), metrics=self.metrics)
+        self.metrics.gauge("writer_queue_depth", lambda: self.writer.queue_depth)
+        self.metrics.gauge("open_handles", lambda: len(self.writer.pool))
+        self.database = DatabaseWriter(cog_data_path(cog_instance=self), metrics=self.metrics)
+        self.metrics.gauge("database_queue_depth", lambda: self.database.queue_depth)
+        self.blobs = BlobStore(cog_data_path(cog_instance=self))
+        for name in ("pending", "stored", "deduplicated", "evicted", "dropped", "failed"):
+            self.metrics.gauge(f"attachments_{name}", functools.partial(getattr, self.blobs, name))
+        # Guild ID -> (RotationPolicy, log format, attachment quota in bytes or 0 if not capturing), so the listener
+        # doesn't read config on every message.
+        self._settings = {}
+        # What was last logged for recent messages, so edits can be written as diffs and deletions say what went.
+        self._history = RecentMessages()
+        self.metrics.gauge("remembered_messages", lambda: len(self._history))
+        # Messages come in through a listener shared with other cogs, so common per-message work only happens once.
+        self._ingest = MessageIngest.attach(bot)
 
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message, *, edit=False):
-        """Check and record every message the bot sees.
+    async def cog_load(self):
+        self.writer.pool.capacity = await self.config.handle_capacity()
+        self.writer.pool.idle_timeout = await self.config.handle_idle_timeout()
+        self.writer.start()
+        self.database.start()
+        self._ingest.subscribe(self, self._on_ingest)
+        if await self.config.metrics_export():
+            self.metrics.start_export(self._metrics_path())
 
-        :param message: The message.
-        :type message: discord.Message
+    async def cog_unload(self):
+        self._ingest.unsubscribe(self)
+        self.metrics.stop_export()
+        await self.blobs.close()
+        # Make sure everything queued up makes it to disk before the cog goes away.
+        await self.writer.close()
+        await self.database.close()
+
+    @commands.group("recorder")
+    async def _recorder(self, ctx: commands.Context):
+        """Base command to manage recorder settings."""
+        pass
+
+    @_recorder.command(name="pool")
+    @checks.is_owner()
+    async def _pool_stats(self, ctx: commands.Context):
+        """Show how the pool of open log files is doing.
+
+        A lot of misses and evictions means the pool is too small for the number of active channels.
+
+        Example:
+            `[p]recorder pool`
+
+        :param ctx: The Discord Red command context.
+        :type ctx: commands.Context
+        """
+        pool = self.writer.pool
+        stats = pool.stats()
+        lookups = stats["hits"] + stats["misses"]
+        hit_rate = stats["hits"] / lookups if lookups else 0
+        text = "\n".join(f"{name}: {value}" for name, value in stats.items())
+        text += f"\nidle_timeout: {pool.idle_timeout}s\nhit_rate: {hit_rate:.1%}"
+        await ctx.send(box(text))
+
+    @_recorder.command(name="poolsize")
+    @checks.is_owner()
+    async def _pool_size(
+        self, ctx: commands.Context, capacity: int, idle_timeout: Optional[int] = None
+    ):
+        """Set how many log files can be open at once, and optionally how long an unused file stays open.
+
+        Example:
+            `[p]recorder poolsize 256 600`
+
+        :param ctx: The Discord Red command context.
+        :type ctx: commands.Context
+        :param capacity: The most log files to keep open.
+        :type capacity: int
+        :param idle_timeout: Seconds an unused file stays open before it's closed.
+        :type idle_timeout: Optional[int]
         """
-        # This can only run in servers.
-        if message.guild is None:
+        if capacity < 1 or (idle_timeout is not None and idle_timeout < 0):
+            await ctx.send("Capacity has to be at least 1 and the timeout can't be negative.")
             return
+        await self.config.handle_capacity.set(capacity)
+        self.writer.pool.capacity = capacity
+        if idle_timeout is not None:
+            await self.config.handle_idle_timeout.set(idle_timeout)
+            self.writer.pool.idle_timeout = idle_timeout
+        await ctx.send(
+            f"Keeping up to {capacity} log files open, closing them after {self.writer.pool.idle_timeout}s unused."
+        )
+
+    @_recorder.group(name="stats", invoke_without_command=True)
+    @checks.is_owner()
+    async def _stats(self, ctx: commands.Context):
+        """Show how long each stage of recording a message takes, plus counters and queue depths.
+
+        Latencies are in milliseconds. Percentiles are the upper edge of the bucket they land in.
+
+        Example:
+            `[p]recorder stats`
+
+        :param ctx: The Discord Red command context.
+        :type ctx: commands.Context
+        """
+        for page in pagify(self.metrics.summary(), shorten_by=16):
+            await ctx.send(box(page))
+
+    @_stats.command(name="export")
+    async def _stats_export(self, ctx: commands.Context, enabled: bool):
+        """Write the stats in Prometheus text format to the cog's data folder once a minute.
+
+        Point node_exporter's textfile collector, or anything else that reads that format, at the file.
+
+        Example:
+            `[p]recorder stats export true`
+
+        :param ctx: The Discord Red command context.
+        :type ctx: commands.Context
+        :param enabled: Whether to write the file.
+        :type enabled: bool
+        """
+        await self.config.metrics_export.set(enabled)
+        if enabled:
+            self.metrics.start_export(self._metrics_path())
+            await ctx.send(f"Writing stats to {self._metrics_path()}.")
+        else:
+            self.metrics.stop_export()
+            await ctx.send("Stopped writing stats.")
+
+    def _metrics_path(self) -> pathlib.Path:
+        return cog_data_path(cog_instance=self) / "metrics.prom"
+
+    async def _get_settings(self, server: discord.Guild) -> Tuple[RotationPolicy, str, int]:
+        """Get how a server's logs are written, loading it from config the first time.
+
+        :param server: The server.
+        :type server: discord.Guild
+        :return: The server's rotation policy, log format, and attachment quota in bytes, or 0 if not capturing.
+        :rtype: Tuple[RotationPolicy, str, int]
+        """
+        cached = self._settings.get(server.id)
+        if cached is None:
+            with self.metrics.timer("config_read"):
+                settings = await self.config.guild(server).all()
+            policy = RotationPolicy(
+                max_bytes=settings["max_mb"] * 1024 * 1024,
+                compression=settings["compression"],
+                retention_days=settings["retention_days"],
+            )
+            quota = settings["capture_quota_mb"] * 1024 * 1024 if settings["capture"] else 0
+            cached = (policy, settings["format"], quota)
+            self._settings[server.id] = cached
+        return cached
+
+    @_recorder.command(name="rotate")
+    @commands.guild_only()
+    @checks.admin_or_permissions(manage_guild=True)
+    async def _rotate(self, ctx: commands.Context, max_mb: int = 0):
+        """Set the size in megabytes a log file can reach before starting a new one. Logs always rotate daily.
+
+        Example:
+            `[p]recorder rotate 100`
+            `[p]recorder rotate 0` to only rotate daily.
+
+        :param ctx: The Discord Red command context.
+        :type ctx: commands.Context
+        :param max_mb: The size limit in megabytes, or 0 for no limit.
+        :type max_mb: int
+        """
+        if max_mb < 0:
+            await ctx.send("The size limit can't be negative.")
+            return
+        await self.config.guild(ctx.guild).max_mb.set(max_mb)
+        self._settings.pop(ctx.guild.id, None)
+        if max_mb:
+            await ctx.send(f"Logs will rotate daily or at {max_mb} MB.")
+        else:
+            await ctx.send("Logs will rotate daily.")
+
+    @_recorder.command(name="compress")
+    @commands.guild_only()
+    @checks.admin_or_permissions(manage_guild=True)
+    async def _compress(self, ctx: commands.Context, compression: str):
+        """Set how finished log files are compressed: gzip, zstd, or none.
+
+        zstd needs the zstandard package installed and falls back to gzip otherwise.
+
+        Example:
+            `[p]recorder compress zstd`
+
+        :param ctx: The Discord Red command context.
+        :type ctx: commands.Context
+        :param compression: gzip, zstd, or none.
+        :type compression: str
+        """
+        compression = compression.lower()
+        if compression not in COMPRESSIONS:
+            await ctx.send(f"Compression has to be one of {', '.join(COMPRESSIONS)}.")
+            return
+        await self.config.guild(ctx.guild).compression.set(compression)
+        self._settings.pop(ctx.guild.id, None)
+        await ctx.send(f"Finished logs will be compressed with {compression}.")
+
+    @_recorder.command(name="retention")
+    @commands.guild_only()
+    @checks.admin_or_permissions(manage_guild=True)
+    async def _retention(self, ctx: commands.Context, days: int = 0):
+        """Set how many days of logs to keep. Older logs are deleted.
+
+        Example:
+            `[p]recorder retention 90`
+            `[p]recorder retention 0` to keep everything.
+
+        :param ctx: The Discord Red command context.
+        :type ctx: commands.Context
+        :param days: Days of logs to keep, or 0 to keep everything.
+        :type days: int
+        """
+        if days < 0:
+            await ctx.send("Retention can't be negative.")
+            return
+        await self.config.guild(ctx.guild).retention_days.set(days)
+        self._settings.pop(ctx.guild.id, None)
+        if days:
+            await ctx.send(f"Logs older than {days} days will be deleted.")
+        else:
+            await ctx.send("Logs will be kept forever.")
+
+    @_recorder.command(name="format")
+    @commands.guild_only()
+    @checks.admin_or_permissions(manage_guild=True)
+    async def _format(self, ctx: commands.Context, log_format: str):
+        """Set how messages are written: text, jsonl, or sqlite.
+
+        jsonl writes one JSON object per message with message, author, and channel IDs, and keeps an index next to
+        each file so tools can jump to a time or message without reading the whole thing.
+
+        sqlite keeps the whole server in one database, `recorder.{server ID}.sqlite3`, indexed by channel, time, and
+        author so searches don't scan every log. Use `[p]recorder migrate` to copy existing logs into it.
+
+        Example:
+            `[p]recorder format jsonl`
+            `[p]recorder format sqlite`
+
+        :param ctx: The Discord Red command context.
+        :type ctx: commands.Context
+        :param log_format: text, jsonl, or sqlite.
+        :type log_format: str
+        """
+        log_format = log_format.lower()
+        if log_format not in FORMATS:
+            await ctx.send(f"Format has to be one of {', '.join(FORMATS)}.")
+            return
+        await self.config.guild(ctx.guild).format.set(log_format)
+        self._settings.pop(ctx.guild.id, None)
+        await ctx.send(f"Messages will be logged as {log_format}.")
+
+    @_recorder.command(name="capture")
+    @commands.guild_only()
+    @checks.admin_or_permissions(manage_guild=True)
+    async def _capture(self, ctx: commands.Context, enabled: bool, quota_mb: Optional[int] = None):
+        """Also record attachments, embeds, and stickers, and save attachment files.
+
+        Files are stored once per unique content under `blobs/{server ID}` in the cog's data folder, named by their
+        sha256, and the log notes the hash once each download finishes. When the server's files go over the quota the
+        oldest ones are deleted.
+
+        Example:
+            `[p]recorder capture true 2048`
+            `[p]recorder capture false`
+
+        :param ctx: The Discord Red command context.
+        :type ctx: commands.Context
+        :param enabled: Whether to capture.
+        :type enabled: bool
+        :param quota_mb: The most megabytes of files to keep for this server.
+        :type quota_mb: Optional[int]
+        """
+        if quota_mb is not None and quota_mb < 1:
+            await ctx.send("The quota has to be at least 1 MB.")
+            return
+        await self.config.guild(ctx.guild).capture.set(enabled)
+        if quota_mb is not None:
+            await self.config.guild(ctx.guild).capture_quota_mb.set(quota_mb)
+        self._settings.pop(ctx.guild.id, None)
+        if enabled:
+            quota_mb = await self.config.guild(ctx.guild).capture_quota_mb()
+            await ctx.send(f"Capturing attachments, keeping up to {quota_mb} MB of files.")
+        else:
+            await ctx.send("Only message text will be logged.")
+
+    def _query(
+        self,
+        ctx: commands.Context,
+        member: discord.Member,
+        channel: discord.TextChannel,
+        start: str,
+        end: Optional[str],
+    ) -> Query:
+        end_time = (
+            _parse_time(end, end=True) if end else datetime.datetime.now(datetime.timezone.utc)
+        )
+        return Query(
+            ctx.guild.name,
+            channel.name,
+            _parse_time(start),
+            end_time,
+            author_id=member.id,
+            author_name=member.name,
+            channel_id=channel.id,
+        )
+
+    async def _searcher(self, guild: discord.Guild, query: Query):
+        """Get a function that streams search results from wherever the server is logging to.
+
+        :param guild: The server being searched.
+        :type guild: discord.Guild
+        :param query: The search.
+        :type query: Query
+        :return: A blocking function returning an iterator of log lines, to run in an executor.
+        """
+        folder = cog_data_path(cog_instance=self)
+        _, log_format, _ = await self._get_settings(guild)
+        if log_format == "sqlite":
+            return functools.partial(search_database, database_path(folder, guild.id), query)
+        return functools.partial(search, folder, query)
+
+    @_recorder.command(name="search")
+    @commands.guild_only()
+    @checks.admin_or_permissions(manage_guild=True)
+    async def _search(
+        self,
+        ctx: commands.Context,
+        member: discord.Member,
+        channel: discord.TextChannel,
+        start: str,
+        end: Optional[str] = None,
+    ):
+        """Page through everything a member said in a channel between two times. Times are UTC.
+
+        Example:
+            `[p]recorder search Brenticus #general 2026-10-01 2026-10-18`
+            `[p]recorder search Brenticus #general 2026-10-18T14:00 2026-10-18T16:30`
+
+        :param ctx: The Discord Red command context.
+        :type ctx: commands.Context
+        :param member: The member to search for.
+        :type member: discord.Member
+        :param channel: The channel to search.
+        :type channel: discord.TextChannel
+        :param start: The earliest date or time to include.
+        :type start: str
+        :param end: The latest date or time to include. Defaults to now.
+        :type end: Optional[str]
+        """
+        query = self._query(ctx, member, channel, start, end)
+        searcher = await self._searcher(ctx.guild, query)
+        # Reading logs is blocking, so it all happens off the event loop.
+        async with ctx.typing():
+            results = await asyncio.get_running_loop().run_in_executor(
+                None, lambda: list(itertools.islice(searcher(), MAX_SEARCH_RESULTS + 1))
+            )
+        if not results:
+            await ctx.send("Nothing found.")
+            return
+        note = ""
+        if len(results) > MAX_SEARCH_RESULTS:
+            results = results[:MAX_SEARCH_RESULTS]
+            note = f"Showing the first {MAX_SEARCH_RESULTS} messages. Use `{ctx.clean_prefix}recorder export` to get everything.\n"
+        pages = [box(page) for page in pagify("".join(results), page_length=1900)]
+        if note:
+            await ctx.send(note)
+        await menu(ctx, pages, DEFAULT_CONTROLS)
+
+    @_recorder.command(name="export")
+    @commands.guild_only()
+    @checks.admin_or_permissions(manage_guild=True)
+    async def _export(
+        self,
+        ctx: commands.Context,
+        member: discord.Member,
+        channel: discord.TextChannel,
+        start: str,
+        end: Optional[str] = None,
+    ):
+        """Get a file of everything a member said in a channel between two times. Times are UTC.
+
+        Example:
+            `[p]recorder export Brenticus #general 2026-10-01 2026-10-18`
+
+        :param ctx: The Discord Red command context.
+        :type ctx: commands.Context
+        :param member: The member to search for.
+        :type member: discord.Member
+        :param channel: The channel to search.
+        :type channel: discord.TextChannel
+        :param start: The earliest date or time to include.
+        :type start: str
+        :param end: The latest date or time to include. Defaults to now.
+        :type end: Optional[str]
+        """
+        query = self._query(ctx, member, channel, start, end)
+        searcher = await self._searcher(ctx.guild, query)
+        export_path = cog_data_path(cog_instance=self) / f"export.{ctx.message.id}.txt"
+
+        def _write_export() -> int:
+            count = 0
+            with open(export_path, "w", encoding="utf-8") as file:
+                for line in searcher():
+                    file.write(line)
+                    count += 1
+            return count
+
+        try:
+            async with ctx.typing():
+                count = await asyncio.get_running_loop().run_in_executor(None, _write_export)
+            if not count:
+                await ctx.send("Nothing found.")
+            elif export_path.stat().st_size > ctx.guild.filesize_limit:
+                await ctx.send("That's too much to upload. Try a shorter time range.")
+            else:
+                filename = f"{member.name}.{channel.name}.txt"
+                await ctx.send(
+                    f"Found {count} messages.", file=discord.File(str(export_path), filename=filename)
+                )
+        finally:
+            if export_path.exists():
+                export_path.unlink()
+
+    @_recorder.command(name="fts")
+    @commands.guild_only()
+    @checks.admin_or_permissions(manage_guild=True)
+    async def _fts(self, ctx: commands.Context, enabled: bool):
+        """Turn full text search of the server's database on or off.
+
+        Only applies to the sqlite format. Turning it on indexes everything already stored, which can take a while
+        for a big server, and makes the database bigger.
+
+        Example:
+            `[p]recorder fts true`
+
+        :param ctx: The Discord Red command context.
+        :type ctx: commands.Context
+        :param enabled: Whether to keep a full text index.
+        :type enabled: bool
+        """
+        try:
+            async with ctx.typing():
+                await self.database.set_fts(ctx.guild.id, enabled)
+        except sqlite3.OperationalError as e:
+            await ctx.send(f"Couldn't change full text search: {e}. SQLite may have been built without FTS5.")
+            return
+        if enabled:
+            await ctx.send(f"Full text search is on. Use `{ctx.clean_prefix}recorder find` to search.")
+        else:
+            await ctx.send("Full text search is off.")
+
+    @_recorder.command(name="find")
+    @commands.guild_only()
+    @checks.admin_or_permissions(manage_guild=True)
+    async def _find(self, ctx: commands.Context, *, terms: str):
+        """Search every message stored in the server's database for words or phrases.
+
+        Needs the sqlite format and `[p]recorder fts` turned on. Terms use SQLite's full text query syntax, so
+        `"exact phrase"`, `word*`, `this OR that`, and `this NOT that` all work.
+
+        Example:
+            `[p]recorder find "meet up" OR party`
+
+        :param ctx: The Discord Red command context.
+        :type ctx: commands.Context
+        :param terms: What to search for.
+        :type terms: str
+        """
+        path = database_path(cog_data_path(cog_instance=self), ctx.guild.id)
+        epoch = datetime.datetime.fromtimestamp(0, datetime.timezone.utc)
+        query = Query(ctx.guild.name, "", epoch, datetime.datetime.now(datetime.timezone.utc))
+        try:
+            async with ctx.typing():
+                results = await asyncio.get_running_loop().run_in_executor(
+                    None,
+                    lambda: list(itertools.islice(search_database(path, query, terms), MAX_SEARCH_RESULTS + 1)),
+                )
+        except sqlite3.OperationalError as e:
+            await ctx.send(
+                f"Couldn't search: {e}. Check the search terms and that `{ctx.clean_prefix}recorder fts` is on."
+            )
+            return
+        if not results:
+            await ctx.send("Nothing found.")
+            return
+        if len(results) > MAX_SEARCH_RESULTS:
+            results = results[:MAX_SEARCH_RESULTS]
+            await ctx.send(f"Showing the first {MAX_SEARCH_RESULTS} messages. Try narrower terms.")
+        pages = [box(page) for page in pagify("".join(results), page_length=1900)]
+        await menu(ctx, pages, DEFAULT_CONTROLS)
+
+    @_recorder.command(name="migrate")
+    @commands.guild_only()
+    @checks.admin_or_permissions(manage_guild=True)
+    async def _migrate(self, ctx: commands.Context):
+        """Copy the server's existing logs into its database, including undated ones from before rotation.
+
+        Files already copied are skipped, so it's safe to run again. Today's files are still being written to, so they
+        wait for a later run. Text logs don't have IDs, so channels and authors are matched to the server's current
+        channels and members by name where possible.
+
+        Example:
+            `[p]recorder migrate`
+
+        :param ctx: The Discord Red command context.
+        :type ctx: commands.Context
+        """
+        channel_ids = {channel.name: channel.id for channel in ctx.guild.text_channels}
+        author_ids = {member.name: member.id for member in ctx.guild.members}
+        async with ctx.typing():
+            files, records = await self.database.migrate(ctx.guild.id, ctx.guild.name, channel_ids, author_ids)
+        await ctx.send(f"Copied {records} records from {files} files.")
+
+    async def _on_ingest(self, facts: MessageFacts):
+        """Check and record every message and edit the bot sees.
+
+        :param facts: The message and what's known about it, shared with other cogs.
+        :type facts: MessageFacts
+        """
+        with self.metrics.timer("on_message"):
+            await self._record(facts)
+
+    async def _record(self, facts: MessageFacts):
+        message = facts.message
+        self.metrics.inc("edits" if facts.edit else "messages")
         # Make sure the bot is allowed in the server.
-        if await self.bot.cog_disabled_in_guild(self, message.guild):
+        if await facts.disabled(self):
             return
         # Collect some information
-        content = message.clean_content
-        if edit:
-            content = f"*edit* {content}"
-        author = f"{message.author.display_name}/{message.author.name}#{message.author.discriminator}"
         channel = f"{message.channel.name}"
-        server = message.guild.name
-        time = message.created_at
-        # Compile the message and filename.
-        log_message = f"{time} | #{channel} | @{author} :: {content}\n"
-        log_file = f"recorder.{server}.{channel}.log"
-        # Write out the message.
-        folder = cog_data_path(cog_instance=self)
-        full_path = folder / log_file
-        with open(full_path, "a") as file:
-            file.write(log_message)
+        server = facts.guild.name
+        policy, log_format, quota = await self._get_settings(facts.guild)
+        capture = bool(quota)
+        content = facts.clean_content
+        author = author_tag(message.author)
+        logged = self._history.get(message.channel.id, message.id) if facts.edit else None
+        self._history.set(message.channel.id, message.id, Logged(content, message.author.id, author))
+        # Edits to messages logged recently are written as a diff against what was logged, when that's shorter.
+        if logged is not None:
+            with self.metrics.timer("diff"):
+                ops = diff_ops(logged.content, content)
+                diff = render_diff(ops)
+            if not ops and not capture:
+                # Nothing in the text changed, like when a link preview loads.
+                self.metrics.inc("unchanged_edits")
+                return
+            if ops and len(diff) < len(content):
+                self.metrics.inc("edit_diffs")
+                with self.metrics.timer("enqueue"):
+                    await self._log_change(
+                        facts.guild,
+                        message.channel,
+                        message.id,
+                        message.edited_at or datetime.datetime.now(datetime.timezone.utc),
+                        message.author.id,
+                        author,
+                        f"*edit* *diff* {diff}",
+                        edit=True,
+                        diff=ops,
+                    )
+                return
+        # Compile the message and hand it off to be written in the background.
+        with self.metrics.timer("format"):
+            if log_format == "jsonl":
+                log_message, timestamp = json_record(message, content, facts.edit, capture)
+            elif log_format == "sqlite":
+                record, timestamp = message_fields(message, content, facts.edit, capture)
+                log_message = render_record(record)
+            else:
+                log_message = text_record(message, content, facts.edit, capture)
+        # Only waits if the writer has fallen behind far enough to fill its queue.
+        with self.metrics.timer("enqueue"):
+            if log_format == "jsonl":
+                await self.writer.write(
+                    server, channel, log_message, policy, "jsonl", (timestamp, message.id)
+                )
+            elif log_format == "sqlite":
+                await self.database.write(facts.guild.id, record, timestamp, policy.retention_days)
+            else:
+                await self.writer.write(server, channel, log_message, policy)
+        logging.info(log_message)
+        # Edits carry the same attachments as the original, which was already captured.
+        if capture and not facts.edit:
+            for attachment in message.attachments:
+                stored = functools.partial(self._record_blob, message, attachment, policy, log_format)
+                self.blobs.capture(facts.guild.id, attachment, quota, stored)
+
+    async def _log_change(
+        self,
+        guild: discord.Guild,
+        channel: discord.abc.GuildChannel,
+        message_id: int,
+        time: datetime.datetime,
+        author_id: Optional[int],
+        author: str,
+        change: str,
+        **fields,
+    ):
+        """Log an edit or deletion that isn't a full copy of the message.
+
+        :param guild: The server.
+        :type guild: discord.Guild
+        :param channel: The channel the message is in.
+        :type channel: discord.abc.GuildChannel
+        :param message_id: The message ID.
+        :type message_id: int
+        :param time: When the change happened.
+        :type time: datetime.datetime
+        :param author_id: The author's ID, if known.
+        :type author_id: Optional[int]
+        :param author: The author, as author_tag() formats them.
+        :type author: str
+        :param change: What happened, for text logs.
+        :type change: str
+        :param fields: What happened, for JSON logs.
+        """
+        policy, log_format, _ = await self._get_settings(guild)
+        channel_name = f"{channel.name}"
+        if log_format == "jsonl":
+            log_message, timestamp = dump_record(
+                *change_fields(message_id, time, channel.id, channel_name, author_id, author, **fields)
+            )
+            await self.writer.write(
+                guild.name, channel_name, log_message, policy, "jsonl", (timestamp, message_id)
+            )
+        elif log_format == "sqlite":
+            record, timestamp = change_fields(
+                message_id, time, channel.id, channel_name, author_id, author, **fields
+            )
+            await self.database.write(guild.id, record, timestamp, policy.retention_days)
+            log_message = render_record(record)
+        else:
+            # Stamped with when the message was sent, like full edits, so it lines up with the original.
+            log_message = text_change_record(
+                discord.utils.snowflake_time(message_id), channel_name, author, change
+            )
+            await self.writer.write(guild.name, channel_name, log_message, policy)
         logging.info(log_message)
 
+    async def _raw_channel(
+        self, guild_id: Optional[int], channel_id: int
+    ) -> Tuple[Optional[discord.Guild], Optional[discord.abc.GuildChannel]]:
+        """Find where a raw event happened, if it's somewhere the cog records.
+
+        :param guild_id: The event's server ID, or None outside servers.
+        :type guild_id: Optional[int]
+        :param channel_id: The event's channel ID.
+        :type channel_id: int
+        :return: The server and channel, or Nones if the event should be ignored.
+        :rtype: Tuple[Optional[discord.Guild], Optional[discord.abc.GuildChannel]]
+        """
+        guild = self.bot.get_guild(guild_id) if guild_id is not None else None
+        if guild is None:
+            return None, None
+        channel = guild.get_channel_or_thread(channel_id)
+        if channel is None or await self.bot.cog_disabled_in_guild(self, guild):
+            return None, None
+        return guild, channel
+
+    @commands.Cog.listener()
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent):
+        """Log edits to messages that aren't in the bot's cache. Cached ones come through the shared listener.
+
+        :param payload: The raw edit.
+        :type payload: discord.RawMessageUpdateEvent
+        """
+        if payload.cached_message is not None:
+            return
+        content = payload.data.get("content")
+        # Updates without content are things like link previews loading.
+        if content is None:
+            return
+        guild, channel = await self._raw_channel(payload.guild_id, payload.channel_id)
+        if guild is None:
+            return
+        self.metrics.inc("uncached_edits")
+        edited = payload.data.get("edited_timestamp")
+        time = (
+            datetime.datetime.fromisoformat(edited)
+            if edited
+            else datetime.datetime.now(datetime.timezone.utc)
+        )
+        logged = self._history.get(channel.id, payload.message_id)
+        if logged is not None:
+            author_id, author = logged.author_id, logged.author
+        else:
+            data = payload.data.get("author", {})
+            author_id = int(data["id"]) if "id" in data else None
+            member = guild.get_member(author_id) if author_id else None
+            username = data.get("username")
+            author = author_tag(member) if member else f"{username}/{username}#{data.get('discriminator')}"
+        self._history.set(channel.id, payload.message_id, Logged(content, author_id, author))
+        ops = diff_ops(logged.content, content) if logged is not None else None
+        if ops == []:
+            return
+        diff = render_diff(ops) if ops else None
+        if diff is not None and len(diff) < len(content):
+            change, fields = f"*edit* *diff* {diff}", {"diff": ops}
+        else:
+            change, fields = f"*edit* {content}", {"content": content}
+        await self._log_change(
+            guild, channel, payload.message_id, time, author_id, author, change, edit=True, **fields
+        )
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        """Log deleted messages, cached or not.
+
+        :param payload: The raw deletion.
+        :type payload: discord.RawMessageDeleteEvent
+        """
+        guild, channel = await self._raw_channel(payload.guild_id, payload.channel_id)
+        if guild is not None:
+            await self._log_delete(guild, channel, payload.message_id, payload.cached_message)
+
     @commands.Cog.listener()
-    async def on_message_edit(self, _prior, message: discord.Message):
-        """Check every edit the bot can see for trigger words.
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent):
+        """Log messages deleted in bulk, like by a purge.
+
+        :param payload: The raw deletion.
+        :type payload: discord.RawBulkMessageDeleteEvent
+        """
+        guild, channel = await self._raw_channel(payload.guild_id, payload.channel_id)
+        if guild is None:
+            return
+        cached = {message.id: message for message in payload.cached_messages}
+        for message_id in sorted(payload.message_ids):
+            await self._log_delete(guild, channel, message_id, cached.get(message_id))
+
+    async def _log_delete(
+        self,
+        guild: discord.Guild,
+        channel: discord.abc.GuildChannel,
+        message_id: int,
+        cached: Optional[discord.Message],
+    ):
+        """Log a deleted message with whatever is known about what it said.
+
+        :param guild: The server.
+        :type guild: discord.Guild
+        :param channel: The channel the message was in.
+        :type channel: discord.abc.GuildChannel
+        :param message_id: The message ID.
+        :type message_id: int
+        :param cached: The message from the bot's cache, if it was there.
+        :type cached: Optional[discord.Message]
+        """
+        self.metrics.inc("deletes")
+        logged = self._history.pop(channel.id, message_id)
+        if logged is not None:
+            content, author_id, author = logged
+        elif cached is not None:
+            content, author_id, author = cached.clean_content, cached.author.id, author_tag(cached.author)
+        else:
+            content, author_id, author = None, None, "unknown"
+        await self._log_change(
+            guild,
+            channel,
+            message_id,
+            datetime.datetime.now(datetime.timezone.utc),
+            author_id,
+            author,
+            f"*deleted* {content if content is not None else '(content not cached)'}",
+            deleted=True,
+            content=content,
+        )
 
-        :param _prior: The message prior to editing.
-        :type _prior: None
-        :param message: The message post edit.
-        :type message: dicord.Message
+    async def _record_blob(
+        self,
+        message: discord.Message,
+        attachment: discord.Attachment,
+        policy: RotationPolicy,
+        log_format: str,
+        digest: str,
+        size: int,
+    ):
+        """Log where a captured attachment was stored.
+
+        :param message: The message the attachment came with.
+        :type message: discord.Message
+        :param attachment: The attachment.
+        :type attachment: discord.Attachment
+        :param policy: The server's rotation policy.
+        :type policy: RotationPolicy
+        :param log_format: The server's log format.
+        :type log_format: str
+        :param digest: The sha256 hex digest it's stored under.
+        :type digest: str
+        :param size: Its size in bytes.
+        :type size: int
         """
-        await self.on_message(message, edit=True)
+        server = message.guild.name
+        channel = f"{message.channel.name}"
+        if log_format == "jsonl":
+            log_message, timestamp = dump_record(*blob_fields(message, attachment, digest, size))
+            await self.writer.write(
+                server, channel, log_message, policy, "jsonl", (timestamp, message.id)
+            )
+        elif log_format == "sqlite":
+            record, timestamp = blob_fields(message, attachment, digest, size)
+            await self.database.write(message.guild.id, record, timestamp, policy.retention_days)
+        else:
+            await self.writer.write(
+                server, channel, text_blob_record(message, attachment, digest, size), policy
+            )
@@ -0,0 +1,334 @@
+import datetime
+import gzip
+import logging
+import os
+import pathlib
+import re
+import shutil
+import urllib.parse
+from typing import List, NamedTuple, Optional, Tuple
+
+try:
+    # zstandard is optional. Without it zstd compression falls back to gzip.
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIONS = ("gzip", "zstd", "none")
+# Characters that can't go in a file name on some platform, plus . since it separates the parts of a segment name.
+# % is included so escaped names can't collide.
+_UNSAFE = re.compile(r'[\x00-\x1f%./\\:*?"<>|]')
+# The date, then the segment number or "legacy" for days split out of a log from before rotation.
+_SEGMENT = re.compile(r"\.(\d{4}-\d{2}-\d{2})(?:\.(\d+|legacy))?\.(?:log|jsonl)(\.gz|\.zst|\.idx)?$")
+
+
+class RotationPolicy(NamedTuple):
+    """How a server's log files get split up, compressed, and cleaned out."""
+
+    # Start a new segment once the current one reaches this size. 0 only rotates daily.
+    max_bytes: int = 0
+    # How closed segments are compressed. One of COMPRESSIONS.
+    compression: str = "gzip"
+    # Delete segments older than this many days. 0 keeps everything.
+    retention_days: int = 0
+
+
+def segment_path(
+    folder: pathlib.Path,
+    server: str,
+    channel: str,
+    date: datetime.date,
+    index: int = 0,
+    ext: str = "log",
+) -> pathlib.Path:
+    """Get the path of a log segment.
+
+    :param folder: The folder log files are written to.
+    :type folder: pathlib.Path
+    :param server: The server name.
+    :type server: str
+    :param channel: The channel name.
+    :type channel: str
+    :param date: The day the segment covers.
+    :type date: datetime.date
+    :param index: Which segment of the day this is, for size based rotation.
+    :type index: int
+    :param ext: The file extension, log for text or jsonl for structured logs.
+    :type ext: str
+    :return: The segment path, like `recorder.{server}.{channel}.2026-10-18.log`.
+    :rtype: pathlib.Path
+    """
+    suffix = f".{index}" if index else ""
+    return folder / f"recorder.{name_part(server)}.{name_part(channel)}.{date.isoformat()}{suffix}.{ext}"
+
+
+def name_part(name: str) -> str:
+    """Escape a server or channel name for use in a file name.
+
+    Characters that aren't allowed in file names are percent encoded, so `AC/DC fans` becomes `AC%2FDC fans`. Dots
+    are too, so one server's name can never be the start of another's segment names.
+
+    :param name: The server or channel name.
+    :type name: str
+    :return: The escaped name.
+    :rtype: str
+    """
+    return _UNSAFE.sub(lambda match: f"%{ord(match.group()):02X}", name)
+
+
+def segment_prefix(server: str, channel: Optional[str] = None) -> str:
+    """Get the start of every segment name for a server, or one of its channels.
+
+    :param server: The server name.
+    :type server: str
+    :param channel: The channel name, or None for every channel.
+    :type channel: Optional[str]
+    :return: The prefix, like `recorder.{server}.{channel}.`.
+    :rtype: str
+    """
+    prefix = f"recorder.{name_part(server)}."
+    return prefix if channel is None else f"{prefix}{name_part(channel)}."
+
+
+def segment_taken(path: pathlib.Path, max_bytes: int) -> bool:
+    """Check whether a segment can't take any more writes, either because it's full or already compressed.
+
+    :param path: The segment path.
+    :type path: pathlib.Path
+    :param max_bytes: The size limit, or 0 for none.
+    :type max_bytes: int
+    :return: True if writes should go to the next segment.
+    :rtype: bool
+    """
+    if any(path.with_name(path.name + ext).exists() for ext in (".gz", ".zst")):
+        return True
+    return bool(max_bytes) and path.exists() and path.stat().st_size >= max_bytes
+
+
+def segment_date(path: pathlib.Path) -> Optional[datetime.date]:
+    """Get the day a segment covers from its name.
+
+    :param path: The segment path.
+    :type path: pathlib.Path
+    :return: The date, or None if this isn't a dated segment.
+    :rtype: Optional[datetime.date]
+    """
+    match = _SEGMENT.search(path.name)
+    if not match:
+        return None
+    return datetime.date.fromisoformat(match.group(1))
+
+
+def segment_number(path: pathlib.Path) -> int:
+    """Get which segment of its day a segment is, for putting segments in the order they were written.
+
+    :param path: The segment path.
+    :type path: pathlib.Path
+    :return: The number from the name, 0 if it has none, or -1 for a day split out of a log from before rotation.
+    :rtype: int
+    """
+    match = _SEGMENT.search(path.name)
+    if not match or not match.group(2):
+        return 0
+    return -1 if match.group(2) == "legacy" else int(match.group(2))
+
+
+def legacy_path(folder: pathlib.Path, server: str, channel: str) -> pathlib.Path:
+    """Get the undated file a channel was logged to before logs were rotated.
+
+    :param folder: The folder log files are written to.
+    :type folder: pathlib.Path
+    :param server: The server name.
+    :type server: str
+    :param channel: The channel name.
+    :type channel: str
+    :return: The path, like `recorder.{server}.{channel}.log`. The names weren't escaped back then.
+    :rtype: pathlib.Path
+    """
+    return folder / f"recorder.{server}.{channel}.log"
+
+
+def legacy_channel(path: pathlib.Path) -> Optional[Tuple[str, str]]:
+    """Get the server and channel an undated log from before rotation was written for.
+
+    Text channel names can't have dots in them, so everything before the last one is the server name.
+
+    :param path: The file.
+    :type path: pathlib.Path
+    :return: (server, channel), or None if this isn't an undated log.
+    :rtype: Optional[Tuple[str, str]]
+    """
+    name = path.name
+    if not (name.startswith("recorder.") and name.endswith(".log")) or segment_date(path) is not None:
+        return None
+    server, dot, channel = name[len("recorder.") : -len(".log")].rpartition(".")
+    return (server, channel) if dot and server and channel else None
+
+
+def legacy_source(path: pathlib.Path) -> Optional[str]:
+    """Get the name of the undated log a segment was split out of.
+
+    :param path: The segment.
+    :type path: pathlib.Path
+    :return: The undated log's file name, or None if the segment wasn't split out of one.
+    :rtype: Optional[str]
+    """
+    match = _SEGMENT.search(path.name)
+    if not match or match.group(2) != "legacy":
+        return None
+    parts = path.name[: match.start()].split(".")
+    if len(parts) != 3:
+        return None
+    return f"recorder.{urllib.parse.unquote(parts[1])}.{urllib.parse.unquote(parts[2])}.log"
+
+
+def split_legacy(folder: pathlib.Path, path: pathlib.Path, server: str, channel: str) -> List[pathlib.Path]:
+    """Split an undated log from before rotation into one segment per day, then delete it.
+
+    Each line goes in the segment for the day it was logged, so edits stay next to what was logged around them like
+    they do in segments written since. Running it again after an interruption starts the days over.
+
+    This does blocking I/O, so run it in an executor.
+
+    :param folder: The folder log files are written to.
+    :type folder: pathlib.Path
+    :param path: The undated log.
+    :type path: pathlib.Path
+    :param server: The server name it was written for.
+    :type server: str
+    :param channel: The channel name it was written for.
+    :type channel: str
+    :return: The segments it was split into.
+    :rtype: List[pathlib.Path]
+    """
+    parts: List[pathlib.Path] = []
+    handle = None
+    current = None
+    # Lines before the first one with a date, which go in that day's segment.
+    pending: List[bytes] = []
+    try:
+        with open(path, "rb") as source:
+            for line in source:
+                date = _legacy_date(line)
+                if date is not None and date != current:
+                    if handle is not None:
+                        handle.close()
+                    part = _legacy_part(folder, server, channel, date)
+                    # Start each day over the first time it comes up, in case an earlier run was interrupted.
+                    handle = open(part, "ab" if part in parts else "wb")
+                    if part not in parts:
+                        parts.append(part)
+                    current = date
+                    handle.writelines(pending)
+                    pending = []
+                if handle is None:
+                    pending.append(line)
+                else:
+                    handle.write(line)
+        if pending:
+            date = datetime.datetime.fromtimestamp(path.stat().st_mtime, datetime.timezone.utc).date()
+            part = _legacy_part(folder, server, channel, date)
+            with open(part, "wb") as handle:
+                handle.writelines(pending)
+            parts.append(part)
+    finally:
+        if handle is not None:
+            handle.close()
+    os.remove(path)
+    return parts
+
+
+def _legacy_part(folder: pathlib.Path, server: str, channel: str, date: datetime.date) -> pathlib.Path:
+    return folder / f"recorder.{name_part(server)}.{name_part(channel)}.{date.isoformat()}.legacy.log"
+
+
+def _legacy_date(line: bytes) -> Optional[datetime.date]:
+    """Get the day an undated log line was logged on, or None for continuations and edits, which are stamped with
+    when the message was sent."""
+    if line.partition(b" :: ")[2].startswith(b"*edit* "):
+        return None
+    try:
+        return datetime.datetime.fromisoformat(line.split(b" | ", 1)[0].decode("utf-8")).date()
+    except (UnicodeDecodeError, ValueError):
+        return None
+
+
+def compress_segment(path: pathlib.Path, compression: str) -> Optional[pathlib.Path]:
+    """Compress a closed segment and remove the original.
+
+    This does blocking I/O, so run it in an executor.
+
+    :param path: The segment to compress.
+    :type path: pathlib.Path
+    :param compression: One of COMPRESSIONS.
+    :type compression: str
+    :return: The compressed file, or None if nothing was done.
+    :rtype: Optional[pathlib.Path]
+    """
+    if compression == "none" or not path.exists():
+        return None
+    if compression == "zstd" and zstandard is None:
+        logging.warning("zstandard isn't installed, compressing recorder logs with gzip.")
+        compression = "gzip"
+    try:
+        if compression == "zstd":
+            target = path.with_name(path.name + ".zst")
+            with open(path, "rb") as src, open(target, "wb") as dst:
+                zstandard.ZstdCompressor().copy_stream(src, dst)
+        else:
+            target = path.with_name(path.name + ".gz")
+            with open(path, "rb") as src, gzip.open(target, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+        os.remove(path)
+    except OSError as e:
+        logging.error(f"EXCEPTION {e}\n  Failed compressing recorder log {path}.")
+        return None
+    return target
+
+
+def sweep(
+    folder: pathlib.Path,
+    server: str,
+    policy: RotationPolicy,
+    today: datetime.date,
+    keep: frozenset = frozenset(),
+):
+    """Compress a server's finished segments and delete ones past retention.
+
+    Undated logs from before rotation are split into days first, so they get compressed and cleaned out too.
+
+    This does blocking I/O, so run it in an executor.
+
+    :param folder: The folder log files are written to.
+    :type folder: pathlib.Path
+    :param server: The server name.
+    :type server: str
+    :param policy: The server's rotation policy.
+    :type policy: RotationPolicy
+    :param today: The current date. Segments from today are never compressed.
+    :type today: datetime.date
+    :param keep: Segments still being written to, which are left alone.
+    :type keep: frozenset
+    """
+    for path in list(folder.glob("recorder.*.log")):
+        owner = legacy_channel(path)
+        if owner is not None and owner[0] == server:
+            try:
+                split_legacy(folder, path, *owner)
+            except OSError as e:
+                logging.error(f"EXCEPTION {e}\n  Failed splitting recorder log {path}.")
+    prefix = segment_prefix(server)
+    cutoff = today - datetime.timedelta(days=policy.retention_days)
+    for path in folder.iterdir():
+        if not path.name.startswith(prefix) or path in keep:
+            continue
+        date = segment_date(path)
+        if date is None:
+            continue
+        try:
+            if policy.retention_days and date < cutoff:
+                os.remove(path)
+            elif date < today and path.suffix in (".log", ".jsonl"):
+                compress_segment(path, policy.compression)
+        except OSError as e:
+            logging.error(f"EXCEPTION {e}\n  Failed cleaning up recorder log {path}.")
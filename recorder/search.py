@@ -0,0 +1,300 @@
+import datetime
+import gzip
+import json
+import mmap
+import pathlib
+from typing import IO, Iterator, List, Optional
+from .formats import find_offset, index_path, render_diff
+from .rotation import (
+    legacy_channel,
+    legacy_path,
+    legacy_source,
+    segment_date,
+    segment_number,
+    segment_prefix,
+    zstandard,
+)
+
+# Text lines for edits and deletions are stamped with when the message was sent, so they can land after lines with
+# later times. Only the other lines are in time order.
+_OUT_OF_ORDER = (b"*edit* ", b"*deleted* ")
+
+
+class Query:
+    """What to look for in a channel's logs."""
+
+    def __init__(
+        self,
+        server: str,
+        channel: str,
+        start: datetime.datetime,
+        end: datetime.datetime,
+        author_id: Optional[int] = None,
+        author_name: Optional[str] = None,
+        channel_id: Optional[int] = None,
+    ):
+        """
+        :param server: The server name the logs were written under.
+        :type server: str
+        :param channel: The channel name the logs were written under.
+        :type channel: str
+        :param start: The earliest message time to include. Must be timezone aware.
+        :type start: datetime.datetime
+        :param end: The latest message time to include. Must be timezone aware.
+        :type end: datetime.datetime
+        :param author_id: Only include messages from this user, matched against JSON logs.
+        :type author_id: Optional[int]
+        :param author_name: Only include messages from this username, matched against text logs which have no IDs.
+        :type author_name: Optional[str]
+        :param channel_id: The channel's ID, matched against the database.
+        :type channel_id: Optional[int]
+        """
+        self.server = server
+        self.channel = channel
+        self.start = start.timestamp()
+        self.end = end.timestamp()
+        self.start_date = start.date()
+        self.end_date = end.date()
+        self.author_id = author_id
+        self.author_name = author_name
+        self.channel_id = channel_id
+
+
+def find_segments(folder: pathlib.Path, query: Query) -> List[pathlib.Path]:
+    """Find the segments for a channel that could hold messages in the query's time range.
+
+    :param folder: The folder log files are written to.
+    :type folder: pathlib.Path
+    :param query: The search.
+    :type query: Query
+    :return: Matching segments in the order they were written.
+    :rtype: List[pathlib.Path]
+    """
+    prefix = segment_prefix(query.server, query.channel)
+    # The channel's undated log from before rotation, if it hasn't been split into days yet. It comes first and
+    # stands in for the days being split out of it.
+    legacy = legacy_path(folder, query.server, query.channel)
+    segments = [legacy] if legacy.is_file() else []
+    dated = []
+    for path in folder.iterdir():
+        if not path.name.startswith(prefix) or path.suffix == ".idx":
+            continue
+        date = segment_date(path)
+        # The date in the name is when the file was written, so a day's slack covers anything logged near midnight.
+        if date is None or not (
+            query.start_date - datetime.timedelta(days=1) <= date <= query.end_date
+        ):
+            continue
+        if segments and legacy_source(path) is not None:
+            continue
+        dated.append((date, segment_number(path), path))
+    return segments + [path for _, _, path in sorted(dated)]
+
+
+def server_segments(folder: pathlib.Path, server: str) -> List[pathlib.Path]:
+    """Find every segment logged for a server, across all channels.
+
+    Undated logs from before rotation come first. Days split out of one are left out while it's still there, since
+    they may be half written.
+
+    :param folder: The folder log files are written to.
+    :type folder: pathlib.Path
+    :param server: The server name the logs were written under.
+    :type server: str
+    :return: The segments, oldest first.
+    :rtype: List[pathlib.Path]
+    """
+    prefix = segment_prefix(server)
+    paths = list(folder.iterdir())
+    legacy = sorted(path for path in paths if (legacy_channel(path) or ("",))[0] == server)
+    legacy_names = {path.name for path in legacy}
+    segments = []
+    for path in paths:
+        if not path.name.startswith(prefix) or path.suffix == ".idx":
+            continue
+        date = segment_date(path)
+        if date is None or legacy_source(path) in legacy_names:
+            continue
+        segments.append((date, segment_number(path), path.name, path))
+    return legacy + [path for _, _, _, path in sorted(segments)]
+
+
+def iter_segment(path: pathlib.Path) -> Iterator[bytes]:
+    """Stream every line of a segment, compressed or not. This does blocking I/O.
+
+    :param path: The segment.
+    :type path: pathlib.Path
+    :return: The raw lines.
+    :rtype: Iterator[bytes]
+    """
+    return _iter_lines(path)
+
+
+def _open_compressed(path: pathlib.Path) -> IO[bytes]:
+    if path.suffix == ".zst":
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is needed to read {path.name}")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return gzip.open(path, "rb")
+
+
+def _iter_lines(path: pathlib.Path, offset: int = 0) -> Iterator[bytes]:
+    """Stream lines from a segment starting at a byte offset, without reading the whole file into memory."""
+    if path.suffix in (".gz", ".zst"):
+        with _open_compressed(path) as file:
+            # Compressed files can't be mapped, so skip ahead by reading through.
+            while offset > 0:
+                skipped = len(file.read(min(offset, 1024 * 1024)))
+                if not skipped:
+                    return
+                offset -= skipped
+            for line in file:
+                yield line
+        return
+    if path.stat().st_size == 0:
+        return
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        position = offset
+        while position < len(data):
+            end = data.find(b"\n", position)
+            end = len(data) if end == -1 else end + 1
+            yield data[position:end]
+            position = end
+
+
+def _text_time(line: bytes) -> Optional[float]:
+    """Get the timestamp a text log line starts with, or None if it's the continuation of a multi-line message."""
+    head = line.split(b" | ", 1)[0]
+    try:
+        return datetime.datetime.fromisoformat(head.decode("utf-8")).timestamp()
+    except ValueError:
+        return None
+
+
+def _line_start(data: mmap.mmap, position: int) -> int:
+    """Get the start of the first line at or after a byte position."""
+    if position == 0:
+        return 0
+    end = data.find(b"\n", position - 1)
+    return len(data) if end == -1 else end + 1
+
+
+def _ordered_time(line: bytes) -> Optional[float]:
+    """Get the timestamp of a line that's in time order, or None for continuations, edits, and deletions."""
+    if line.partition(b" :: ")[2].startswith(_OUT_OF_ORDER):
+        return None
+    return _text_time(line)
+
+
+def _next_time(data: mmap.mmap, position: int) -> Optional[float]:
+    """Get the time of the first line in time order at or after a byte position."""
+    position = _line_start(data, position)
+    while position < len(data):
+        end = data.find(b"\n", position)
+        end = len(data) if end == -1 else end
+        timestamp = _ordered_time(data[position:end])
+        if timestamp is not None:
+            return timestamp
+        position = end + 1
+    return None
+
+
+def _text_offset(path: pathlib.Path, timestamp: float) -> int:
+    """Binary search an uncompressed text segment for where lines at or after a time can start.
+
+    The search only looks at lines in time order. It then steps back to just after the last of those before the
+    time, since any edit or deletion stamped at or after the time was logged after that line.
+    """
+    if path.stat().st_size == 0:
+        return 0
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        low, high = 0, len(data)
+        while low < high:
+            mid = (low + high) // 2
+            line_time = _next_time(data, mid)
+            if line_time is None or line_time >= timestamp:
+                high = mid
+            else:
+                low = mid + 1
+        position = _line_start(data, low)
+        while position > 0:
+            start = data.rfind(b"\n", 0, position - 1) + 1
+            if _ordered_time(data[start : position - 1]) is not None:
+                break
+            position = start
+        return position
+
+
+def _search_jsonl(path: pathlib.Path, query: Query) -> Iterator[str]:
+    offset = 0
+    index = index_path(path)
+    if index.exists() and index.stat().st_size:
+        with open(index, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offset = find_offset(data, query.start)
+        if offset is None:
+            return
+    for line in _iter_lines(path, offset):
+        try:
+            record = json.loads(line)
+            timestamp = datetime.datetime.fromisoformat(record["ts"]).timestamp()
+        except (ValueError, KeyError):
+            continue
+        if timestamp > query.end:
+            return
+        if timestamp < query.start:
+            continue
+        if query.author_id is not None and record.get("author_id") != query.author_id:
+            continue
+        yield render_record(record)
+
+
+def render_record(record: dict) -> str:
+    """Format a structured record like a text log line, for search results and exports.
+
+    :param record: The record, from a JSON log or the database.
+    :type record: dict
+    :return: The line, including the trailing newline.
+    :rtype: str
+    """
+    content = record.get("content")
+    if "diff" in record:
+        content = f"*edit* *diff* {render_diff(record['diff'])}"
+    elif record.get("deleted"):
+        content = f"*deleted* {content if content is not None else '(content not cached)'}"
+    return f"{record['ts']} | #{record.get('channel')} | @{record.get('author')} :: {content}\n"
+
+
+def _search_text(path: pathlib.Path, query: Query) -> Iterator[str]:
+    offset = 0 if path.suffix in (".gz", ".zst") else _text_offset(path, query.start)
+    author = f"/{query.author_name}#" if query.author_name else None
+    include = False
+    # Edits and deletions of messages in range can be logged any time later, so read to the end of the segment.
+    for raw in _iter_lines(path, offset):
+        line = raw.decode("utf-8", errors="replace")
+        timestamp = _text_time(raw)
+        if timestamp is not None:
+            include = query.start <= timestamp <= query.end and (
+                author is None or author in line.split(" :: ", 1)[0]
+            )
+        # Lines without a timestamp belong to the message before them.
+        if include:
+            yield line
+
+
+def search(folder: pathlib.Path, query: Query) -> Iterator[str]:
+    """Stream every logged message matching a query, as text log lines.
+
+    This does blocking I/O, so run it in an executor.
+
+    :param folder: The folder log files are written to.
+    :type folder: pathlib.Path
+    :param query: The search.
+    :type query: Query
+    :return: Matching messages in the order they were logged.
+    :rtype: Iterator[str]
+    """
+    for path in find_segments(folder, query):
+        if ".jsonl" in path.suffixes:
+            yield from _search_jsonl(path, query)
+        else:
+            yield from _search_text(path, query)
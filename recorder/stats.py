@@ -0,0 +1,206 @@
+# This file is shared by the recorder and snitch cogs. Keep both copies identical.
+import asyncio
+import bisect
+import contextlib
+import logging
+import os
+import pathlib
+import time
+from typing import Callable, Dict, List, Optional
+
+# Histogram bucket upper bounds in seconds, from 10 microseconds to 5 seconds.
+BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class Histogram:
+    """A fixed bucket latency histogram. Cheap enough to update on every message."""
+
+    def __init__(self):
+        self.counts: List[int] = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        """Record one duration.
+
+        :param seconds: How long it took.
+        :type seconds: float
+        """
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile as the upper bound of the bucket it falls in.
+
+        :param q: The quantile, between 0 and 1.
+        :type q: float
+        :return: The estimate in seconds, or infinity if it's past the last bucket.
+        :rtype: float
+        """
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        running = 0
+        for bound, count in zip(BUCKETS + (float("inf"),), self.counts):
+            running += count
+            if running >= target:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+    """Always-on counters, latency histograms, and gauges for a cog.
+
+    Counters and histograms are plain attributes updated in place, so the hot path only pays for a dict lookup and
+    a couple of additions. Gauges are functions read whenever the metrics are dumped.
+    """
+
+    def __init__(self, namespace: str):
+        """
+        :param namespace: Prefix for exported metric names, like snitch or recorder.
+        :type namespace: str
+        """
+        self.namespace = namespace
+        self.counters: Dict[str, int] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self.gauges: Dict[str, Callable[[], float]] = {}
+        self._export_task: Optional[asyncio.Task] = None
+
+    def inc(self, name: str, amount: int = 1):
+        """Add to a counter.
+
+        :param name: The counter.
+        :type name: str
+        :param amount: How much to add.
+        :type amount: int
+        """
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name: str, seconds: float):
+        """Record a duration in a histogram.
+
+        :param name: The histogram.
+        :type name: str
+        :param seconds: How long it took.
+        :type seconds: float
+        """
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.observe(seconds)
+
+    @contextlib.contextmanager
+    def timer(self, name: str):
+        """Time a block, including anything it awaits, into a histogram.
+
+        :param name: The histogram.
+        :type name: str
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def gauge(self, name: str, read: Callable[[], float]):
+        """Register a value that's read when metrics are dumped, like a queue depth.
+
+        :param name: The gauge.
+        :type name: str
+        :param read: Returns the current value.
+        :type read: Callable[[], float]
+        """
+        self.gauges[name] = read
+
+    def _read_gauges(self) -> Dict[str, float]:
+        values = {}
+        for name, read in self.gauges.items():
+            try:
+                values[name] = read()
+            except Exception as e:
+                logging.error(f"EXCEPTION {e}\n  Couldn't read {self.namespace} gauge {name}.")
+        return values
+
+    def summary(self) -> str:
+        """Format everything for reading in Discord.
+
+        :return: One line per metric. Latencies show count, mean, and bucketed p50/p99 in milliseconds.
+        :rtype: str
+        """
+        lines = []
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"{name}: {value}")
+        for name, value in sorted(self._read_gauges().items()):
+            lines.append(f"{name}: {value:g}")
+        for name, histogram in sorted(self.histograms.items()):
+            mean = histogram.sum / histogram.count * 1000 if histogram.count else 0
+            lines.append(
+                f"{name}: n={histogram.count} mean={mean:.3f}ms "
+                f"p50<={histogram.quantile(0.5) * 1000:g}ms p99<={histogram.quantile(0.99) * 1000:g}ms"
+            )
+        return "\n".join(lines) or "Nothing recorded yet."
+
+    def prometheus(self) -> str:
+        """Format everything in the Prometheus text exposition format.
+
+        :return: The metrics text.
+        :rtype: str
+        """
+        prefix = self.namespace
+        lines = []
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        for name, value in sorted(self._read_gauges().items()):
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {value}")
+        for name, histogram in sorted(self.histograms.items()):
+            metric = f"{prefix}_{name}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            running = 0
+            for bound, count in zip(BUCKETS, histogram.counts):
+                running += count
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {running}')
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {histogram.count}')
+            lines.append(f"{metric}_sum {histogram.sum}")
+            lines.append(f"{metric}_count {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def start_export(self, path: pathlib.Path, interval: float = 60.0):
+        """Start rewriting a Prometheus text file every so often, for node_exporter's textfile collector or similar.
+
+        :param path: The file to write.
+        :type path: pathlib.Path
+        :param interval: Seconds between writes.
+        :type interval: float
+        """
+        self.stop_export()
+        self._export_task = asyncio.create_task(self._export(path, interval))
+
+    def stop_export(self):
+        """Stop exporting, if it's running."""
+        if self._export_task is not None:
+            self._export_task.cancel()
+            self._export_task = None
+
+    @property
+    def exporting(self) -> bool:
+        return self._export_task is not None
+
+    async def _export(self, path: pathlib.Path, interval: float):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, _write_atomic, path, self.prometheus())
+            except OSError as e:
+                logging.error(f"EXCEPTION {e}\n  Couldn't write {self.namespace} metrics to {path}.")
+            await asyncio.sleep(interval)
+
+
+def _write_atomic(path: pathlib.Path, text: str):
+    """Write a file so readers never see it half written."""
+    temp = path.with_name(path.name + ".tmp")
+    with open(temp, "w", encoding="utf-8") as file:
+        file.write(text)
+    os.replace(temp, path)
@@ -0,0 +1,334 @@
+import asyncio
+import concurrent.futures
+import datetime
+import logging
+import os
+import pathlib
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from .formats import INDEX_ENTRY, index_path
+from .rotation import RotationPolicy, compress_segment, segment_path, segment_taken, sweep
+from .stats import Metrics
+
+# Lines waiting to be written, keyed by (server, channel, ext), with the index entry for each if it has one.
+Batch = Dict[Tuple[str, str, str], List[Tuple[str, Optional[Tuple[float, int]]]]]
+# How often finished segments are compressed and old ones deleted, in seconds.
+SWEEP_INTERVAL = 3600
+
+
+class HandlePool:
+    """A bounded pool of open append handles, least recently used first out.
+
+    Not thread safe. The LogWriter only ever touches it from its writer thread.
+    """
+
+    def __init__(self, capacity: int = 128, idle_timeout: float = 300.0):
+        """
+        :param capacity: The most files to keep open at once.
+        :type capacity: int
+        :param idle_timeout: How long a handle can go unused before it gets closed, in seconds.
+        :type idle_timeout: float
+        """
+        self.capacity = capacity
+        self.idle_timeout = idle_timeout
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.idle_closes = 0
+        # Path -> (handle, last used). Ordered oldest use first.
+        self._handles: "OrderedDict[pathlib.Path, Tuple[object, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._handles)
+
+    def get(self, path: pathlib.Path, binary: bool = False):
+        """Get an append handle for a path, opening it and evicting the least recently used handle if needed.
+
+        :param path: The file to append to.
+        :type path: pathlib.Path
+        :param binary: Open the file in binary mode rather than as UTF-8 text.
+        :type binary: bool
+        :return: An open file handle.
+        """
+        entry = self._handles.get(path)
+        if entry is not None:
+            self.hits += 1
+            self._handles.move_to_end(path)
+            handle = entry[0]
+        else:
+            self.misses += 1
+            while len(self._handles) >= max(self.capacity, 1):
+                _, (old, _) = self._handles.popitem(last=False)
+                old.close()
+                self.evictions += 1
+            # No newline translation, so byte offsets in the index match what's on disk.
+            handle = open(path, "ab") if binary else open(path, "a", encoding="utf-8", newline="")
+        self._handles[path] = (handle, time.monotonic())
+        return handle
+
+    def discard(self, path: pathlib.Path):
+        """Close the handle for a path if it's open.
+
+        :param path: The file to stop writing to.
+        :type path: pathlib.Path
+        """
+        entry = self._handles.pop(path, None)
+        if entry is not None:
+            entry[0].close()
+
+    def close_idle(self):
+        """Close every handle that hasn't been used within the idle timeout."""
+        cutoff = time.monotonic() - self.idle_timeout
+        while self._handles:
+            path, (handle, last_used) = next(iter(self._handles.items()))
+            if last_used > cutoff:
+                break
+            del self._handles[path]
+            handle.close()
+            self.idle_closes += 1
+
+    def close_all(self):
+        """Close every handle in the pool."""
+        for handle, _ in self._handles.values():
+            handle.close()
+        self._handles.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Get the pool counters.
+
+        :return: Counter values keyed by name.
+        :rtype: Dict[str, int]
+        """
+        return {
+            "open": len(self._handles),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "idle_closes": self.idle_closes,
+        }
+
+
+class LogWriter:
+    """Write log lines from a background task so listeners never touch the disk.
+
+    Lines are queued per (server, channel) and written out in batches once enough have built up or enough time has
+    passed. File handles stay open between batches in a HandlePool and the actual writes happen on a dedicated thread.
+
+    Each channel writes to a dated segment that rolls over daily, or sooner if the server's RotationPolicy sets a size
+    limit. Finished segments get compressed on a second thread so rotation never holds up writes.
+    """
+
+    def __init__(
+        self,
+        folder: pathlib.Path,
+        max_queue: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        metrics: Optional[Metrics] = None,
+    ):
+        """
+        :param folder: The folder log files are written to.
+        :type folder: pathlib.Path
+        :param max_queue: How many lines can be waiting before writers have to wait for room.
+        :type max_queue: int
+        :param batch_size: How many lines to collect before forcing a flush.
+        :type batch_size: int
+        :param flush_interval: The longest a line should sit in memory before being written, in seconds.
+        :type flush_interval: float
+        :param metrics: Where to record flush timings, if anywhere.
+        :type metrics: Optional[Metrics]
+        """
+        self.folder = folder
+        self.metrics = metrics or Metrics("recorder_writer")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.pool = HandlePool()
+        self._task = None
+        # A single worker keeps every file operation in order on one thread.
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="recorder-writer"
+        )
+        self._compressor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="recorder-compress"
+        )
+        # Server name -> latest rotation policy seen for it.
+        self._policies: Dict[str, RotationPolicy] = {}
+        # (server, channel, ext) -> (date, index) of the segment currently being written.
+        self._segments: Dict[Tuple[str, str, str], Tuple[datetime.date, int]] = {}
+
+    def start(self):
+        """Start the background task."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def write(
+        self,
+        server: str,
+        channel: str,
+        line: str,
+        policy: Optional[RotationPolicy] = None,
+        ext: str = "log",
+        index: Optional[Tuple[float, int]] = None,
+    ):
+        """Queue a line to be written. Only waits if the queue is full.
+
+        :param server: The server name.
+        :type server: str
+        :param channel: The channel name.
+        :type channel: str
+        :param line: The line to write, including the trailing newline.
+        :type line: str
+        :param policy: The server's rotation policy. Defaults to daily rotation with gzip and no retention limit.
+        :type policy: Optional[RotationPolicy]
+        :param ext: The segment extension, log for text or jsonl for structured logs.
+        :type ext: str
+        :param index: The (timestamp, message ID) to add to the segment's sidecar index, if it has one.
+        :type index: Optional[Tuple[float, int]]
+        """
+        if policy is not None:
+            self._policies[server] = policy
+        await self._queue.put((server, channel, ext, line, index))
+
+    async def close(self):
+        """Stop the background task, write out anything still queued, and close every file."""
+        if self._task is not None:
+            # The sentinel lands behind everything already queued, so the task writes all of it before exiting.
+            await self._queue.put(None)
+            await self._task
+            self._task = None
+        await self._run_in_executor(self.pool.close_all)
+        self._executor.shutdown(wait=True)
+        # Let any compression in progress finish without holding up the event loop.
+        await asyncio.get_running_loop().run_in_executor(None, self._compressor.shutdown)
+
+    async def _run(self):
+        batch: Batch = {}
+        pending = 0
+        deadline = time.monotonic() + self.flush_interval
+        next_sweep = time.monotonic()
+        while True:
+            timeout = max(deadline - time.monotonic(), 0)
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                item = ()
+            if item is None:
+                await self._flush(batch)
+                return
+            if item:
+                server, channel, ext, line, index = item
+                batch.setdefault((server, channel, ext), []).append((line, index))
+                pending += 1
+            if pending >= self.batch_size or time.monotonic() >= deadline:
+                await self._flush(batch)
+                await self._run_in_executor(self.pool.close_idle)
+                batch = {}
+                pending = 0
+                deadline = time.monotonic() + self.flush_interval
+            if time.monotonic() >= next_sweep:
+                self._sweep()
+                next_sweep = time.monotonic() + SWEEP_INTERVAL
+
+    async def _run_in_executor(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, func, *args
+        )
+
+    @property
+    def queue_depth(self) -> int:
+        """How many lines are waiting to be written."""
+        return self._queue.qsize()
+
+    async def _flush(self, batch: Batch):
+        if not batch:
+            return
+        try:
+            with self.metrics.timer("flush"):
+                written, failed = await self._run_in_executor(self._write_batch, batch)
+            self.metrics.inc("batches")
+            self.metrics.inc("lines_written", written)
+            if failed:
+                self.metrics.inc("flush_errors", failed)
+        except Exception as e:
+            self.metrics.inc("flush_errors")
+            logging.error(f"EXCEPTION {e}\n  Failed writing {len(batch)} recorder logs.")
+
+    def _write_batch(self, batch: Batch) -> Tuple[int, int]:
+        """Runs in the executor. Returns how many lines were written and how many segments failed.
+
+        A segment that can't be written only loses its own lines, not the rest of the batch.
+        """
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        written = failed = 0
+        for key, records in batch.items():
+            try:
+                self._write_segment(key, records, today)
+                written += len(records)
+            except OSError as e:
+                failed += 1
+                server, channel, ext = key
+                logging.error(
+                    f"EXCEPTION {e}\n  Failed writing {len(records)} {ext} lines for {server} #{channel}."
+                )
+        return written, failed
+
+    def _write_segment(self, key: Tuple[str, str, str], records: list, today: datetime.date):
+        """Runs in the executor."""
+        server, channel, ext = key
+        policy = self._policies.get(server, RotationPolicy())
+        path = self._segment(key, policy, today)
+        handle = self.pool.get(path)
+        offset = os.fstat(handle.fileno()).st_size
+        handle.write("".join(line for line, _ in records))
+        handle.flush()
+        entries = []
+        for line, index in records:
+            if index is not None:
+                entries.append(INDEX_ENTRY.pack(offset, *index))
+            offset += len(line.encode("utf-8"))
+        if entries:
+            index_handle = self.pool.get(index_path(path), binary=True)
+            index_handle.write(b"".join(entries))
+            index_handle.flush()
+        if policy.max_bytes and offset >= policy.max_bytes:
+            date, number = self._segments[key]
+            self._retire(path, policy)
+            self._segments[key] = (date, number + 1)
+
+    def _segment(
+        self, key: Tuple[str, str, str], policy: RotationPolicy, today: datetime.date
+    ) -> pathlib.Path:
+        """Runs in the executor. Get the segment a channel should write to, rolling over to a new day if needed."""
+        server, channel, ext = key
+        current = self._segments.get(key)
+        if current is not None:
+            if current[0] == today:
+                return segment_path(self.folder, server, channel, *current, ext=ext)
+            self._retire(segment_path(self.folder, server, channel, *current, ext=ext), policy)
+        # Skip past anything a previous run already filled up or compressed.
+        number = 0
+        path = segment_path(self.folder, server, channel, today, ext=ext)
+        while segment_taken(path, policy.max_bytes):
+            number += 1
+            path = segment_path(self.folder, server, channel, today, number, ext)
+        self._segments[key] = (today, number)
+        return path
+
+    def _retire(self, path: pathlib.Path, policy: RotationPolicy):
+        """Runs in the executor. Close a finished segment and queue it up for compression."""
+        self.pool.discard(path)
+        self.pool.discard(index_path(path))
+        self._compressor.submit(compress_segment, path, policy.compression)
+
+    def _sweep(self):
+        """Queue up compression and retention cleanup for every server that's been written to."""
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        keep = set()
+        for (server, channel, ext), current in list(self._segments.items()):
+            path = segment_path(self.folder, server, channel, *current, ext=ext)
+            keep.update((path, index_path(path)))
+        for server, policy in list(self._policies.items()):
+            self._compressor.submit(sweep, self.folder, server, policy, today, frozenset(keep))
@@ -0,0 +1,167 @@
+import csv
+import io
+import json
+from typing import Dict, List
+
+FORMATS = ("json", "csv")
+# The biggest file [p]snitch import will read.
+MAX_IMPORT_BYTES = 1024 * 1024
+# One row per word, target, message, debounce, or normalize setting. id is only used for targets.
+CSV_FIELDS = ("group", "kind", "value", "id")
+
+
+def parse(data: bytes, filename: str) -> Dict[str, dict]:
+    """Read notification groups from an uploaded JSON or CSV file.
+
+    JSON is an object of groups, each with optional words, targets, message, debounce, and normalize. Targets can be
+    a list of names or IDs as you'd pass to [p]snitch to, or the object [p]snitch export writes. CSV has the columns
+    in CSV_FIELDS, with kind being word, target, message, debounce, or normalize.
+
+    :param data: The file contents.
+    :type data: bytes
+    :param filename: The file name, used to tell the format apart.
+    :type filename: str
+    :return: Group name -> {"words": [...], "targets": [(name, lookup), ...]} plus message, debounce, and normalize
+        if given.
+        lookup is what to resolve the target from, the ID if there is one.
+    :rtype: Dict[str, dict]
+    :raises ValueError: If the file can't be read or has something invalid in it.
+    """
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ValueError("the file isn't UTF-8 text")
+    if filename.lower().endswith(".csv"):
+        return _parse_csv(text)
+    try:
+        raw = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"invalid JSON ({e})")
+    return _parse_json(raw)
+
+
+def _empty() -> dict:
+    return {"words": [], "targets": []}
+
+
+def _check_debounce(group: str, value) -> int:
+    try:
+        seconds = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"debounce for {group} isn't a whole number")
+    if seconds < 0:
+        raise ValueError(f"debounce for {group} can't be negative")
+    return seconds
+
+
+def _check_flag(group: str, value) -> bool:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in ("true", "false"):
+        return value.strip().lower() == "true"
+    raise ValueError(f"normalize for {group} should be true or false")
+
+
+def _parse_json(raw) -> Dict[str, dict]:
+    if not isinstance(raw, dict):
+        raise ValueError("expected an object of groups")
+    groups = {}
+    for name, settings in raw.items():
+        if not name or not isinstance(settings, dict):
+            raise ValueError(f"group {name!r} should be an object")
+        group = _empty()
+        words = settings.get("words", [])
+        if not isinstance(words, list) or not all(isinstance(w, str) and w for w in words):
+            raise ValueError(f"words for {name} should be a list of text")
+        group["words"] = words
+        targets = settings.get("targets", [])
+        if isinstance(targets, dict):
+            # What export writes: the name it was added as -> {"id", "type"}.
+            for target, stored in targets.items():
+                target_id = stored.get("id") if isinstance(stored, dict) else None
+                group["targets"].append((target, str(target_id) if target_id else target))
+        elif isinstance(targets, list) and all(isinstance(t, str) and t for t in targets):
+            group["targets"] = [(target, target) for target in targets]
+        else:
+            raise ValueError(f"targets for {name} should be a list of names or IDs")
+        if settings.get("message") is not None:
+            if not isinstance(settings["message"], str):
+                raise ValueError(f"message for {name} should be text")
+            group["message"] = settings["message"]
+        if settings.get("debounce") is not None:
+            group["debounce"] = _check_debounce(name, settings["debounce"])
+        if settings.get("normalize") is not None:
+            group["normalize"] = _check_flag(name, settings["normalize"])
+        groups[name] = group
+    return groups
+
+
+def _parse_csv(text: str) -> Dict[str, dict]:
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames or not {"group", "kind", "value"} <= set(reader.fieldnames):
+        raise ValueError(f"the header should be {','.join(CSV_FIELDS)}")
+    groups = {}
+    # Row 1 is the header.
+    for number, row in enumerate(reader, 2):
+        name = (row.get("group") or "").strip()
+        kind = (row.get("kind") or "").strip().lower()
+        value = row.get("value") or ""
+        if not name:
+            raise ValueError(f"row {number} has no group")
+        group = groups.setdefault(name, _empty())
+        if kind == "word":
+            if not value:
+                raise ValueError(f"row {number} has an empty word")
+            group["words"].append(value)
+        elif kind == "target":
+            if not value:
+                raise ValueError(f"row {number} has an empty target")
+            target_id = (row.get("id") or "").strip()
+            group["targets"].append((value, target_id or value))
+        elif kind == "message":
+            group["message"] = value
+        elif kind == "debounce":
+            group["debounce"] = _check_debounce(name, value)
+        elif kind == "normalize":
+            group["normalize"] = _check_flag(name, value)
+        else:
+            raise ValueError(
+                f"row {number} has unknown kind {kind!r}, expected word, target, message, debounce, or normalize"
+            )
+    return groups
+
+
+def dump(notifygroups: Dict[str, dict], file_format: str) -> bytes:
+    """Write notification groups out in a format parse() reads back.
+
+    Debounce and normalize are always written, even when off, so importing the file over existing groups sets them
+    back to what was exported. That also gives every group at least one CSV row.
+
+    :param notifygroups: The server's notification groups, as stored in config.
+    :type notifygroups: Dict[str, dict]
+    :param file_format: json or csv.
+    :type file_format: str
+    :return: The file contents.
+    :rtype: bytes
+    """
+    notifygroups = {
+        name: {**group, "debounce": group.get("debounce") or 0, "normalize": bool(group.get("normalize"))}
+        for name, group in notifygroups.items()
+    }
+    if file_format == "json":
+        return json.dumps(notifygroups, indent=2, ensure_ascii=False).encode("utf-8")
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(CSV_FIELDS)
+    for name, group in notifygroups.items():
+        rows: List[tuple] = [(name, "word", word, "") for word in group.get("words", [])]
+        rows += [
+            (name, "target", target, stored["id"])
+            for target, stored in group.get("targets", {}).items()
+        ]
+        if group.get("message") is not None:
+            rows.append((name, "message", group["message"], ""))
+        rows.append((name, "debounce", group["debounce"], ""))
+        rows.append((name, "normalize", "true" if group["normalize"] else "false", ""))
+        writer.writerows(rows)
+    return out.getvalue().encode("utf-8")
@@ -0,0 +1,88 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """A size bounded mapping whose entries expire after a while.
+
+    When full, the entry that was set longest ago is evicted to make room. Expired entries are cleared out as new
+    ones are set, so memory stays bounded even if nothing is ever read back.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 3600.0):
+        """
+        :param maxsize: The most entries to hold.
+        :type maxsize: int
+        :param ttl: The default number of seconds an entry lives.
+        :type ttl: float
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # Key -> (expiry, value). Ordered oldest set first.
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get a value if it's there and hasn't expired.
+
+        :param key: The key.
+        :type key: Hashable
+        :param default: What to return if there's no live entry.
+        :type default: Any
+        :return: The value or the default.
+        :rtype: Any
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        if entry[0] <= time.monotonic():
+            del self._data[key]
+            return default
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Set a value, replacing any existing one.
+
+        :param key: The key.
+        :type key: Hashable
+        :param value: The value.
+        :type value: Any
+        :param ttl: Seconds this entry lives, if different from the cache default.
+        :type ttl: Optional[float]
+        """
+        now = time.monotonic()
+        self._data.pop(key, None)
+        self._data[key] = (now + (self.ttl if ttl is None else ttl), value)
+        # Entries are roughly in expiry order, so clearing from the front catches most expired ones cheaply.
+        while self._data:
+            oldest_key, (expiry, _) = next(iter(self._data.items()))
+            if expiry > now and len(self._data) <= self.maxsize:
+                break
+            del self._data[oldest_key]
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove an entry and return its value if it hadn't expired.
+
+        :param key: The key.
+        :type key: Hashable
+        :param default: What to return if there's no live entry.
+        :type default: Any
+        :return: The value or the default.
+        :rtype: Any
+        """
+        value = self.get(key, _MISSING)
+        self._data.pop(key, None)
+        return default if value is _MISSING else value
+
+    def clear(self):
+        """Remove everything."""
+        self._data.clear()
+
+
+_MISSING = object()
@@ -0,0 +1,242 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+import discord
+
+# Discord doesn't publish DM limits, so stay well under what gets a bot flagged for spam.
+DM_RATE = 5.0
+DM_BURST = 5
+# Channels allow 5 messages per 5 seconds.
+CHANNEL_RATE = 1.0
+CHANNEL_BURST = 5
+# How long to pause everything on a 429 that doesn't say how long to wait.
+DEFAULT_BACKOFF = 5.0
+MAX_RETRIES = 3
+
+
+class TokenBucket:
+    """Classic token bucket. Tokens refill continuously at a fixed rate up to a burst capacity."""
+
+    def __init__(self, rate: float, capacity: int):
+        """
+        :param rate: Tokens added per second.
+        :type rate: float
+        :param capacity: The most tokens the bucket can hold.
+        :type capacity: int
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a token is available and take it."""
+        # The lock keeps waiters in line so a burst can't jump the queue.
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class Dispatcher:
+    """Send notifications from a fixed pool of workers, respecting per-route rate limits.
+
+    Every send is queued with a route, either ("dm",) for direct messages or ("channel", id) for a channel. Each
+    route has its own queue, drained by a task that waits on the route's token bucket and only hands a send to the
+    workers once it has a token, so a backlog on one route never ties up workers that other routes could use. A 429
+    pauses every route until the retry time has passed, then the send is retried.
+    """
+
+    def __init__(self, workers: int = 20, max_queue: int = 10000):
+        """
+        :param workers: How many sends can be in flight at once.
+        :type workers: int
+        :param max_queue: How many sends can be waiting before callers have to wait for room.
+        :type max_queue: int
+        """
+        self.workers = workers
+        self.max_queue = max_queue
+        # Sends waiting for a token, per route, and the task draining each route that has any.
+        self._routes: Dict[Hashable, deque] = {}
+        self._drains: Dict[Hashable, asyncio.Task] = {}
+        # Sends that have their token and are waiting for a worker.
+        self._ready: asyncio.Queue = asyncio.Queue()
+        # Queued sends that haven't been sent or given up on, counting retries once.
+        self._pending = 0
+        self._room = asyncio.Semaphore(max_queue)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._buckets: Dict[Hashable, TokenBucket] = {}
+        self._tasks = []
+        self._resume_at = 0.0
+        self.in_flight = 0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.rate_limited = 0
+        # Seconds from being queued to being sent, for the most recent sends.
+        self._latencies = deque(maxlen=1000)
+
+    def start(self):
+        """Start the workers."""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def close(self):
+        """Stop the workers. Anything still queued is dropped."""
+        tasks = self._tasks + list(self._drains.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._drains.clear()
+        self._routes.clear()
+        self._ready = asyncio.Queue()
+        self._room = asyncio.Semaphore(self.max_queue)
+        self._pending = 0
+        self._idle.set()
+
+    async def join(self):
+        """Wait until everything queued has been sent or given up on."""
+        await self._idle.wait()
+
+    async def submit(self, route: Hashable, send: Callable[[], Awaitable], description: str = ""):
+        """Queue a send. Only waits if the queue is full.
+
+        :param route: What rate limit the send falls under, ("dm",) or ("channel", id).
+        :type route: Hashable
+        :param send: Called to make the send. It's called again on retries, so it has to make a fresh coroutine.
+        :type send: Callable[[], Awaitable]
+        :param description: What's being sent where, for the logs.
+        :type description: str
+        """
+        await self._room.acquire()
+        self._pending += 1
+        self._idle.clear()
+        self._enqueue(route, (route, send, description, time.monotonic(), 0))
+
+    def stats(self) -> Dict[str, float]:
+        """Get the dispatch metrics.
+
+        :return: Metric values keyed by name. Latencies are in seconds.
+        :rtype: Dict[str, float]
+        """
+        latencies = sorted(self._latencies)
+
+        def percentile(p: float) -> float:
+            return latencies[min(int(len(latencies) * p), len(latencies) - 1)] if latencies else 0.0
+
+        return {
+            "queue_depth": self._pending - self.in_flight,
+            "in_flight": self.in_flight,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "rate_limited": self.rate_limited,
+            "backoff_remaining": max(self._resume_at - time.monotonic(), 0.0),
+            "latency_p50": percentile(0.5),
+            "latency_p99": percentile(0.99),
+        }
+
+    def _bucket(self, route: Hashable) -> TokenBucket:
+        bucket = self._buckets.get(route)
+        if bucket is None:
+            if route[0] == "dm":
+                bucket = TokenBucket(DM_RATE, DM_BURST)
+            else:
+                bucket = TokenBucket(CHANNEL_RATE, CHANNEL_BURST)
+            self._buckets[route] = bucket
+        return bucket
+
+    def _back_off(self, retry_after: Optional[float]):
+        self.rate_limited += 1
+        self._resume_at = max(self._resume_at, time.monotonic() + (retry_after or DEFAULT_BACKOFF))
+
+    def _enqueue(self, route: Hashable, item: tuple):
+        self._routes.setdefault(route, deque()).append(item)
+        if route not in self._drains:
+            self._drains[route] = asyncio.create_task(self._drain(route))
+
+    async def _drain(self, route: Hashable):
+        """Hand a route's sends to the workers as fast as its bucket allows, then exit once it's empty."""
+        queue = self._routes[route]
+        try:
+            while queue:
+                await self._wait_out_backoff()
+                await self._bucket(route).acquire()
+                self._ready.put_nowait(queue.popleft())
+        finally:
+            del self._drains[route]
+            if not queue:
+                self._routes.pop(route, None)
+
+    async def _wait_out_backoff(self):
+        # Everyone waits out a global backoff, even if their own route looks fine.
+        while (wait := self._resume_at - time.monotonic()) > 0:
+            await asyncio.sleep(wait)
+
+    def _done(self):
+        self._pending -= 1
+        self._room.release()
+        if not self._pending:
+            self._idle.set()
+
+    async def _work(self):
+        while True:
+            route, send, description, queued_at, attempts = await self._ready.get()
+            retrying = False
+            try:
+                await self._wait_out_backoff()
+                self.in_flight += 1
+                try:
+                    await send()
+                finally:
+                    self.in_flight -= 1
+                self.sent += 1
+                self._latencies.append(time.monotonic() - queued_at)
+            except discord.RateLimited as e:
+                logging.error(
+                    f"EXCEPTION {e}\n  Hit excessive rate limit. Waiting {e.retry_after} seconds to try again."
+                )
+                self._back_off(e.retry_after)
+                retrying = self._retry(route, send, description, queued_at, attempts)
+            except discord.HTTPException as e:
+                if e.status == 429:
+                    logging.error(f"EXCEPTION {e}\n  Rate limited sending {description}.")
+                    self._back_off(None)
+                    retrying = self._retry(route, send, description, queued_at, attempts)
+                else:
+                    self.failed += 1
+                    logging.error(f"EXCEPTION {e}\n  Failed sending {description}.")
+            except Exception as e:
+                self.failed += 1
+                logging.error(f"EXCEPTION {e}\n  Failed sending {description}.")
+            finally:
+                if not retrying:
+                    self._done()
+
+    def _retry(
+        self,
+        route: Hashable,
+        send: Callable[[], Awaitable],
+        description: str,
+        queued_at: float,
+        attempts: int,
+    ) -> bool:
+        """Put a rate limited send back on its route. Returns False if it's been tried too many times."""
+        if attempts >= MAX_RETRIES:
+            self.failed += 1
+            logging.error(f"Giving up sending {description} after {attempts + 1} tries.")
+            return False
+        self.retried += 1
+        # A retry keeps its place in the pending count, so there's always room for it.
+        self._enqueue(route, (route, send, description, queued_at, attempts + 1))
+        return True
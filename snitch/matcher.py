@@ -0,0 +1,300 @@
+import re
+import unicodedata
+from collections import deque
+from typing import Collection, Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple
+
+try:
+    # pyahocorasick is a C extension and much faster, but it's optional so the cog still installs without a compiler.
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+_WORD = re.compile(r"\w+")
+# Any character repeated, so "wiiiifi" and "wifi" normalize the same.
+_REPEATS = re.compile(r"(.)\1+", flags=re.S)
+# Invisible characters that can be slipped into a word to split it up without changing how it looks.
+_INVISIBLE = (
+    "\u00ad\u034f\u061c\u115f\u1160\u17b4\u17b5\u180e\u200b\u200c\u200d\u200e\u200f"
+    "\u2060\u2061\u2062\u2063\u2064\ufeff"
+)
+# Discord markdown that can be wrapped around part of a word, like wi**fi**.
+_MARKDOWN = "*_~`|\\"
+# Letters from other scripts that look like Latin ones but don't decompose to them.
+_LOOKALIKES = {
+    # Cyrillic
+    "а": "a", "в": "b", "г": "r", "е": "e", "ё": "e", "з": "3", "и": "u", "к": "k", "м": "m", "н": "h",
+    "о": "o", "п": "n", "р": "p", "с": "c", "т": "t", "у": "y", "х": "x", "ѕ": "s", "і": "i", "ї": "i",
+    "ј": "j", "һ": "h", "ԁ": "d", "ԛ": "q", "ԝ": "w", "ӏ": "l",
+    # Greek
+    "α": "a", "β": "b", "γ": "y", "ε": "e", "η": "n", "ι": "i", "κ": "k", "ν": "v", "ο": "o", "ρ": "p",
+    "τ": "t", "υ": "u", "χ": "x", "ω": "w", "ϲ": "c", "ϳ": "j",
+    # Latin letters without a decomposition
+    "ı": "i", "ł": "l", "ø": "o", "đ": "d", "ħ": "h", "ŀ": "l", "ß": "ss", "æ": "ae", "œ": "oe",
+}
+# Blocks whose letters and digits decompose to plain ASCII: accented Latin, letterlike symbols, enclosed forms,
+# ligatures, fullwidth forms, and the mathematical alphabets.
+_DECOMPOSABLE = (
+    (0x00C0, 0x024F),
+    (0x1E00, 0x1EFF),
+    (0x2100, 0x214F),
+    (0x2460, 0x24FF),
+    (0xFB00, 0xFB06),
+    (0xFF00, 0xFFEF),
+    (0x1D400, 0x1D7FF),
+    (0x1F130, 0x1F189),
+)
+
+
+def _normalize_table() -> Dict[int, Optional[str]]:
+    """Build the str.translate table normalize() uses. Runs once at import."""
+    table: Dict[int, Optional[str]] = {}
+    for first, last in _DECOMPOSABLE:
+        for code in range(first, last + 1):
+            # Compatibility decomposition turns 𝐰 into w, ｗ into w, and é into e plus a combining accent.
+            base = "".join(
+                c for c in unicodedata.normalize("NFKD", chr(code)) if not unicodedata.combining(c)
+            ).lower()
+            if base and base.isascii() and base.isalnum() and base != chr(code):
+                table[code] = base
+    for lookalike, latin in _LOOKALIKES.items():
+        table[ord(lookalike)] = latin
+        # Only map capitals that lowercase to the lookalike, so something like "ß" doesn't pick up a stray key.
+        if lookalike.upper().lower() == lookalike and len(lookalike.upper()) == 1:
+            table[ord(lookalike.upper())] = latin
+    for char in _INVISIBLE + _MARKDOWN:
+        table[ord(char)] = None
+    return table
+
+
+_NORMALIZE = _normalize_table()
+
+
+def normalize(text: str) -> str:
+    """Fold text so look-alike spellings of a word all come out the same.
+
+    Lowercases, maps homoglyphs and accented or styled letters to plain ASCII, drops zero-width characters and
+    markdown, and collapses repeated characters. Each step is a single C level pass over the text.
+
+    :param text: The text to normalize.
+    :type text: str
+    :return: The normalized text. Offsets don't line up with the original.
+    :rtype: str
+    """
+    return _REPEATS.sub(r"\1", text.lower().translate(_NORMALIZE))
+
+
+def _is_word_char(char: str) -> bool:
+    """Mirror what `re` counts as a word character for `\\b` on str patterns.
+
+    :param char: The character to check.
+    :type char: str
+    :return: True if the character is alphanumeric or an underscore.
+    :rtype: bool
+    """
+    return char.isalnum() or char == "_"
+
+
+def _fold(text: str) -> str:
+    """Lowercase text without changing its length so match offsets still line up with the original.
+
+    :param text: The text to fold.
+    :type text: str
+    :return: The lowercased text.
+    :rtype: str
+    """
+    folded = text.lower()
+    if len(folded) == len(text):
+        return folded
+    # A handful of characters (like İ) lowercase to more than one character. Leave those alone.
+    return "".join(c if len(c.lower()) != 1 else c.lower() for c in text)
+
+
+class _PyAutomaton:
+    """Pure Python Aho-Corasick automaton, used when pyahocorasick isn't installed."""
+
+    def __init__(self, words: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[str, ...]] = [()]
+        for word in words:
+            self._insert(word)
+        self._link()
+
+    def _insert(self, word: str):
+        state = 0
+        for char in word:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+                self._goto[state][char] = nxt
+            state = nxt
+        self._out[state] = (word,)
+
+    def _link(self):
+        # Breadth first so every state's failure target is finished before its children need it.
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(char, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def iter(self, text: str) -> Iterator[Tuple[int, str]]:
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for end, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for word in out[state]:
+                yield end, word
+
+
+class TriggerMatcher:
+    """Match every notification group's trigger words against a message in one pass.
+
+    Matching follows the old per-group regex: case insensitive, and each word has to sit on `\\b` word boundaries.
+    With normalized set, triggers and messages both go through normalize() first, and the boundaries are checked in
+    the normalized text.
+    """
+
+    def __init__(self, groups: Mapping[str, Iterable[str]], normalized: bool = False):
+        """
+        :param groups: Trigger words keyed by notification group name.
+        :type groups: Mapping[str, Iterable[str]]
+        :param normalized: Whether to match normalized text instead of just ignoring case.
+        :type normalized: bool
+        """
+        self._prepare = normalize if normalized else _fold
+        # The last message prepared, since could_match() and find() are called on the same text one after the other.
+        self._prepared: Tuple[Optional[str], str] = (None, "")
+        self._groups: Dict[str, List[Tuple[str, str]]] = {}
+        for group, words in groups.items():
+            for word in words or ():
+                key = self._prepare(word) if word else ""
+                if key:
+                    self._groups.setdefault(key, []).append((group, word))
+        # Every maximal run of word characters in a trigger shows up as a whole token in any message it matches, so
+        # a message sharing no tokens with the triggers can be thrown out with one C level regex pass. Triggers
+        # with no word characters at all can't be screened this way.
+        self._tokens: Set[str] = set()
+        self._screenable = True
+        for key in self._groups:
+            tokens = _WORD.findall(key)
+            if tokens:
+                self._tokens.add(max(tokens, key=len))
+            else:
+                self._screenable = False
+        self._automaton = None
+        if not self._groups:
+            return
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for key in self._groups:
+                self._automaton.add_word(key, key)
+            self._automaton.make_automaton()
+        else:
+            self._automaton = _PyAutomaton(self._groups)
+
+    def __bool__(self) -> bool:
+        return self._automaton is not None
+
+    def could_match(self, text: str) -> bool:
+        """Cheaply rule out text that can't contain any trigger word.
+
+        A True result only means find() needs to run. A False result is certain.
+
+        :param text: The message content to check.
+        :type text: str
+        :return: False if nothing can match.
+        :rtype: bool
+        """
+        if self._automaton is None or not text:
+            return False
+        if not self._screenable:
+            return True
+        return not self._tokens.isdisjoint(_WORD.findall(self._prepared_text(text)))
+
+    def find(self, text: str) -> Dict[str, Set[str]]:
+        """Find every trigger word in the text.
+
+        :param text: The message content to search.
+        :type text: str
+        :return: The matched words keyed by the group they belong to.
+        :rtype: Dict[str, Set[str]]
+        """
+        found: Dict[str, Set[str]] = {}
+        if self._automaton is None or not text:
+            return found
+        folded = self._prepared_text(text)
+        last = len(folded) - 1
+        for end, key in self._automaton.iter(folded):
+            start = end - len(key) + 1
+            before = start > 0 and _is_word_char(folded[start - 1])
+            after = end < last and _is_word_char(folded[end + 1])
+            if before == _is_word_char(folded[start]) or after == _is_word_char(folded[end]):
+                continue
+            for group, word in self._groups[key]:
+                found.setdefault(group, set()).add(word)
+        return found
+
+    def _prepared_text(self, text: str) -> str:
+        if self._prepared[0] is not text:
+            self._prepared = (text, self._prepare(text))
+        return self._prepared[1]
+
+
+class GroupMatcher:
+    """Match groups that use normalization and groups that don't, with the same interface as TriggerMatcher.
+
+    Each kind of group gets its own automaton, so plain groups keep exact matching and normalized groups only cost
+    the one normalize() pass per message, no matter how many of them there are.
+    """
+
+    def __init__(self, groups: Mapping[str, Iterable[str]], normalized: Collection[str] = ()):
+        """
+        :param groups: Trigger words keyed by notification group name.
+        :type groups: Mapping[str, Iterable[str]]
+        :param normalized: The names of the groups that match normalized text.
+        :type normalized: Collection[str]
+        """
+        self._plain = TriggerMatcher({g: words for g, words in groups.items() if g not in normalized})
+        self._normalized = TriggerMatcher(
+            {g: words for g, words in groups.items() if g in normalized}, normalized=True
+        )
+
+    def __bool__(self) -> bool:
+        return bool(self._plain) or bool(self._normalized)
+
+    def could_match(self, text: str) -> bool:
+        """Cheaply rule out text that can't contain any trigger word.
+
+        A True result only means find() needs to run. A False result is certain.
+
+        :param text: The message content to check.
+        :type text: str
+        :return: False if nothing can match.
+        :rtype: bool
+        """
+        return self._plain.could_match(text) or self._normalized.could_match(text)
+
+    def find(self, text: str) -> Dict[str, Set[str]]:
+        """Find every trigger word in the text.
+
+        :param text: The message content to search.
+        :type text: str
+        :return: The matched words keyed by the group they belong to.
+        :rtype: Dict[str, Set[str]]
+        """
+        found = self._plain.find(text)
+        # A group is only ever in one of the two matchers, so there's nothing to merge.
+        found.update(self._normalized.find(text))
+        return found
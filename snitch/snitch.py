@@ -1,11 +1,25 @@
 import asyncio
+import contextlib
 import discord
+import functools
+import io
 import logging
-import re
+import time
 from datetime import timezone
-from typing import Optional, Union
+from typing import Dict, Optional, Set, Tuple, Union
 from redbot.core import checks, Config, commands
-from redbot.core.utils.chat_formatting import pagify
+from redbot.core.data_manager import cog_data_path
+from redbot.core.utils.chat_formatting import box, pagify
+from .bulk import FORMATS, MAX_IMPORT_BYTES, dump, parse
+from .cache import TTLCache
+from .dispatch import Dispatcher
+from .ingest import MessageFacts, MessageIngest
+from .matcher import GroupMatcher
+from .stats import Metrics
+from .targets import NameIndex, RoleMembers
+
+# How long warm-up builds matchers before letting the event loop handle other work, in seconds.
+WARM_UP_SLICE = 0.01
 
 
 class Snitch(commands.Cog):
@@ -20,6 +34,47 @@ class Snitch(commands.Cog):
         self.config = Config.get_conf(self, identifier=586925412)
         default_guild_settings = {"notifygroups": {}}
         self.config.register_guild(**default_guild_settings)
+        self.config.register_global(metrics_export=False)
+        # Trigger matchers per guild, keyed by guild ID and tagged with the config version they were built from.
+        self._config_versions = {}
+        self._matcher_cache = {}
+        # Builds every server's matchers after a restart. Servers it hasn't reached yet build on their first message.
+        self._warm_up_task: Optional[asyncio.Task] = None
+        # Cap at 20 simultaneous requests.
+        self.dispatcher = Dispatcher(workers=20)
+        # (message ID, group) for messages that already sent a notification, so edits don't send them again.
+        self._notified = TTLCache(maxsize=50000, ttl=3600)
+        # (guild ID, group) -> open debounce window collecting matches to send as one digest.
+        self._windows = TTLCache(maxsize=10000)
+        self._flush_tasks = set()
+        self._role_members = RoleMembers()
+        self._names = NameIndex()
+        self.metrics = Metrics("snitch")
+        for name in self.dispatcher.stats():
+            self.metrics.gauge(f"dispatch_{name}", functools.partial(self._dispatch_stat, name))
+        self.metrics.gauge("debounce_windows", lambda: len(self._windows))
+        self.metrics.gauge("cached_matchers", lambda: len(self._matcher_cache))
+
+        # Messages come in through a listener shared with other cogs, so common per-message work only happens once.
+        self._ingest = MessageIngest.attach(bot)
+
+    async def cog_load(self):
+        self.dispatcher.start()
+        self._ingest.subscribe(self, self._on_ingest)
+        if await self.config.metrics_export():
+            self.metrics.start_export(self._metrics_path())
+        self._warm_up_task = asyncio.create_task(self._warm_up())
+
+    async def cog_unload(self):
+        self._ingest.unsubscribe(self)
+        self.metrics.stop_export()
+        if self._warm_up_task is not None:
+            self._warm_up_task.cancel()
+        for task in self._flush_tasks:
+            task.cancel()
+        # Let the cancellations land before the dispatcher closes, so no window can queue a send after it.
+        await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+        await self.dispatcher.close()
 
     @commands.group("snitch")
     @commands.guild_only()
@@ -28,7 +83,7 @@ class Snitch(commands.Cog):
         """Base command to manage snitch settings."""
         pass
 
-    def _identify_target(
+    async def _identify_target(
         self, ctx: commands.Context, target: str
     ) -> Union[discord.abc.Messageable, None]:
         """Try to convert a potential target into a messageable interface.
@@ -53,32 +108,11 @@ class Snitch(commands.Cog):
                 pass
             elif coerced := server.get_channel(int(maybe_id)):
                 pass
-        # If that doesn't work we need to filter through a bunch of object names to find a match.
+        # If that doesn't work look the name up, checking roles, then members, then channels. The index is built the
+        # first time it's needed in a server and kept current from events after that.
         elif not coerced:
-            # Check roles for matches.
-            matches = [
-                role for role in ctx.guild.roles if role.name.lower() == target.lower()
-            ]
-            # Grab the first match if one exists.
-            coerced = matches.pop(0) if any(matches) else None
-            # If no match do the same for members.
-            if not coerced:
-                matches = [
-                    member
-                    for member in ctx.guild.members
-                    if member.name.lower() == target.lower()
-                    or member.display_name.lower() == target.lower()
-                ]
-                coerced = matches.pop(0) if any(matches) else None
-            # And channels.
-            if not coerced:
-                matches = [
-                    channel
-                    for channel in ctx.guild.channels
-                    if channel.name.lower() == target.lower()
-                    and isinstance(channel, discord.TextChannel)
-                ]
-                coerced = matches.pop(0) if any(matches) else None
+            await self._names.ready(server)
+            coerced = self._names.find(server, target)
         return coerced
 
     @_snitch.command(name="to")
@@ -97,12 +131,13 @@ class Snitch(commands.Cog):
         :type targets: List[str]
         """
         server = ctx.guild
-        async with self.config.guild(server).notifygroups() as notifygroups:
+        # Resolve everything before touching config so config isn't held while the name index builds.
+        resolved = [(target, await self._identify_target(ctx, target)) for target in targets]
+        async with self._edit_groups(server) as notifygroups:
             notifygroup = notifygroups.get(group)
             if not notifygroup:
                 notifygroup = {"words": [], "targets": {}}
-            for target in targets:
-                coerced = self._identify_target(ctx, target)
+            for target, coerced in resolved:
                 # We store the coerced value so things are easier later.
                 if coerced:
                     target_type = type(coerced).__name__
@@ -130,10 +165,11 @@ class Snitch(commands.Cog):
         :type targets: List[str]
         """
         server = ctx.guild
-        async with self.config.guild(server).notifygroups() as notifygroups:
+        async with self._edit_groups(server) as notifygroups:
             notifygroup = notifygroups.get(group)
             if not notifygroup:
                 await ctx.channel.send(f"Group doesn't exist.")
+                return
             for target in targets:
                 if target in notifygroup["targets"]:
                     notifygroup["targets"].pop(target)
@@ -156,7 +192,7 @@ class Snitch(commands.Cog):
         :type words: List[str]
         """
         server = ctx.guild
-        async with self.config.guild(server).notifygroups() as notifygroups:
+        async with self._edit_groups(server) as notifygroups:
             notifygroup = notifygroups.get(group)
             if not notifygroup:
                 notifygroup = {"words": [], "targets": {}}
@@ -181,14 +217,17 @@ class Snitch(commands.Cog):
         :type group: List[str]
         """
         server = ctx.guild
-        async with self.config.guild(server).notifygroups() as notifygroups:
+        async with self._edit_groups(server) as notifygroups:
             notifygroup = notifygroups.get(group)
             if not notifygroup:
-                notifygroup = {"words": [], "targets": {}}
+                await ctx.channel.send(f"Group doesn't exist.")
+                return
             for word in words:
-                notifygroup["words"].remove(word)
-                await ctx.channel.send(f"{word} will no longer trigger a notification.")
-            notifygroups[group] = notifygroup
+                if word in notifygroup["words"]:
+                    notifygroup["words"].remove(word)
+                    await ctx.channel.send(f"{word} will no longer trigger a notification.")
+                else:
+                    await ctx.channel.send(f"Couldn't find {word}.")
 
     @_snitch.command(name="with", require_var_positional=True)
     async def _message_change(self, ctx: commands.Context, group: str, message: str):
@@ -211,7 +250,7 @@ class Snitch(commands.Cog):
         :type message: str
         """
         server = ctx.guild
-        async with self.config.guild(server).notifygroups() as notifygroups:
+        async with self._edit_groups(server) as notifygroups:
             notifygroup = notifygroups.get(group)
             if not notifygroup:
                 notifygroup = {"words": [], "targets": {}}
@@ -219,6 +258,63 @@ class Snitch(commands.Cog):
             notifygroups[group] = notifygroup
             await ctx.channel.send(f"Message for {group} updated.")
 
+    @_snitch.command(name="debounce")
+    async def _debounce_change(self, ctx: commands.Context, group: str, seconds: int):
+        """Merge notifications for a group that come within this many seconds of each other. 0 turns it off.
+
+        The first match sends right away. Any more matches in the window are sent together as one digest when it
+        closes.
+
+        Example:
+            `[p]snitch debounce tech 60`
+
+        :param ctx: The Discord Red command context.
+        :type ctx: commands.Context
+        :param group: The notification group to modify.
+        :type group: str
+        :param seconds: The length of the window in seconds.
+        :type seconds: int
+        """
+        server = ctx.guild
+        if seconds < 0:
+            await ctx.channel.send("The window can't be negative.")
+            return
+        async with self._edit_groups(server) as notifygroups:
+            notifygroup = notifygroups.get(group)
+            if not notifygroup:
+                notifygroup = {"words": [], "targets": {}}
+            notifygroup["debounce"] = seconds
+            notifygroups[group] = notifygroup
+            await ctx.channel.send(f"Debounce for {group} set to {seconds} seconds.")
+
+    @_snitch.command(name="normalize")
+    async def _normalize_change(self, ctx: commands.Context, group: str, enabled: bool):
+        """Match the group's trigger words against a normalized copy of each message.
+
+        Catches look-alike spellings: any case, letters from other scripts that look Latin, accented or styled
+        letters, zero-width characters, markdown inside a word, and repeated letters. `wiiifi`, `wі**fі**`, and `𝐰𝐢𝐟𝐢`
+        all trigger `wifi`. Words still have to stand on their own, and the normalized word can catch more than you'd
+        expect, since `too` and `to` come out the same.
+
+        Example:
+            `[p]snitch normalize tech true`
+
+        :param ctx: The Discord Red command context.
+        :type ctx: commands.Context
+        :param group: The notification group to modify.
+        :type group: str
+        :param enabled: Whether to match normalized text.
+        :type enabled: bool
+        """
+        server = ctx.guild
+        async with self._edit_groups(server) as notifygroups:
+            notifygroup = notifygroups.get(group)
+            if not notifygroup:
+                notifygroup = {"words": [], "targets": {}}
+            notifygroup["normalize"] = enabled
+            notifygroups[group] = notifygroup
+            await ctx.channel.send(f"Normalized matching for {group} turned {'on' if enabled else 'off'}.")
+
     @_snitch.command(name="clear")
     async def _clear_list(self, ctx: commands.Context, group: str = None):
         """Remove all config data for the group. Omit the group to clear all config data for this cog.
@@ -236,9 +332,10 @@ class Snitch(commands.Cog):
         # If group isn't identified clear everything.
         if not group:
             await self.config.guild(ctx.guild).notifygroups.clear()
+            self._invalidate(server)
             await ctx.channel.send("Cleared all snitch settings.")
             return
-        async with self.config.guild(server).notifygroups() as notifygroups:
+        async with self._edit_groups(server) as notifygroups:
             if notifygroups.get(group):
                 notifygroups.pop(group)
                 await ctx.channel.send(f"Removed {group} from snitch settings.")
@@ -277,6 +374,172 @@ class Snitch(commands.Cog):
             )
             await ctx.send("I can't send direct messages to you.")
 
+    @_snitch.command(name="import")
+    async def _import(self, ctx: commands.Context, replace: bool = False):
+        """Load notification groups from an attached JSON or CSV file in one go.
+
+        Groups in the file are merged into the existing ones: words and targets are added, and a message, debounce,
+        or normalize setting in the file replaces the current one. Pass `true` to replace every group instead. The file can be one made by
+        `[p]snitch export`.
+
+        JSON looks like `{"tech": {"words": ["wifi"], "targets": ["#tech-general"], "message": "...", "debounce": 60}}`.
+        CSV has the header `group,kind,value,id`, with kind being word, target, message, debounce, or normalize.
+
+        Example:
+            [p]snitch import
+            [p]snitch import true
+
+        :param ctx: The Discord Red command context.
+        :type ctx: commands.Context
+        :param replace: Whether to drop every existing group first.
+        :type replace: bool
+        """
+        server = ctx.guild
+        if not ctx.message.attachments:
+            await ctx.send("Attach a .json or .csv file to import.")
+            return
+        attachment = ctx.message.attachments[0]
+        if attachment.size > MAX_IMPORT_BYTES:
+            await ctx.send(f"{attachment.filename} is too big to import.")
+            return
+        try:
+            groups = parse(await attachment.read(), attachment.filename)
+        except ValueError as e:
+            await ctx.send(f"Couldn't import {attachment.filename}: {e}.")
+            return
+        # Resolve every target up front so config is only opened once, and each distinct name only looked up once.
+        resolved = {}
+        unresolved = []
+        for group in groups.values():
+            targets = {}
+            for target, lookup in group["targets"]:
+                if lookup not in resolved:
+                    resolved[lookup] = await self._identify_target(ctx, lookup)
+                coerced = resolved[lookup]
+                if coerced:
+                    targets[target] = {"id": coerced.id, "type": type(coerced).__name__}
+                else:
+                    unresolved.append(target)
+            group["targets"] = targets
+        words_added = targets_added = 0
+        async with self._edit_groups(server) as notifygroups:
+            if replace:
+                notifygroups.clear()
+            for name, group in groups.items():
+                notifygroup = notifygroups.get(name)
+                if not notifygroup:
+                    notifygroup = {"words": [], "targets": {}}
+                known = set(notifygroup["words"])
+                for word in group["words"]:
+                    if word not in known:
+                        notifygroup["words"].append(word)
+                        known.add(word)
+                        words_added += 1
+                targets_added += len(group["targets"].keys() - notifygroup["targets"].keys())
+                notifygroup["targets"].update(group["targets"])
+                for setting in ("message", "debounce", "normalize"):
+                    if setting in group:
+                        notifygroup[setting] = group[setting]
+                notifygroups[name] = notifygroup
+        summary = (
+            f"Imported {len(groups)} groups from {attachment.filename}"
+            f" with {words_added} new words and {targets_added} new targets."
+        )
+        if unresolved:
+            shown = ", ".join(unresolved[:20])
+            more = f" and {len(unresolved) - 20} more" if len(unresolved) > 20 else ""
+            summary += f"\nCould not identify {shown}{more}."
+        await ctx.send(summary)
+
+    @_snitch.command(name="export")
+    async def _export(self, ctx: commands.Context, file_format: str = "json"):
+        """Attach this server's notification groups as a file that `[p]snitch import` can load.
+
+        Example:
+            [p]snitch export
+            [p]snitch export csv
+
+        :param ctx: The Discord Red command context.
+        :type ctx: commands.Context
+        :param file_format: json or csv.
+        :type file_format: str
+        """
+        file_format = file_format.lower()
+        if file_format not in FORMATS:
+            await ctx.send(f"Format has to be one of {', '.join(FORMATS)}.")
+            return
+        notifygroups = await self.config.guild(ctx.guild).notifygroups()
+        if not notifygroups:
+            await ctx.send("There are no current notification groups set up in this server.")
+            return
+        data = dump(notifygroups, file_format)
+        await ctx.send(
+            f"Exported {len(notifygroups)} groups.",
+            file=discord.File(io.BytesIO(data), filename=f"snitch.{ctx.guild.id}.{file_format}"),
+        )
+
+    @_snitch.command(name="queue")
+    @checks.is_owner()
+    async def _queue_stats(self, ctx: commands.Context):
+        """Show how the notification queue is doing.
+
+        Example:
+            [p]snitch queue
+
+        :param ctx: The Discord Red command context.
+        :type ctx: commands.Context
+        """
+        stats = self.dispatcher.stats()
+        text = "\n".join(
+            f"{name}: {value:.3f}" if isinstance(value, float) else f"{name}: {value}"
+            for name, value in stats.items()
+        )
+        await ctx.send(box(text))
+
+    @_snitch.group(name="stats", invoke_without_command=True)
+    @checks.is_owner()
+    async def _stats(self, ctx: commands.Context):
+        """Show how long each stage of handling a message takes, plus counters and queue depths.
+
+        Latencies are in milliseconds. Percentiles are the upper edge of the bucket they land in.
+
+        Example:
+            [p]snitch stats
+
+        :param ctx: The Discord Red command context.
+        :type ctx: commands.Context
+        """
+        for page in pagify(self.metrics.summary(), shorten_by=16):
+            await ctx.send(box(page))
+
+    @_stats.command(name="export")
+    async def _stats_export(self, ctx: commands.Context, enabled: bool):
+        """Write the stats in Prometheus text format to the cog's data folder once a minute.
+
+        Point node_exporter's textfile collector, or anything else that reads that format, at the file.
+
+        Example:
+            [p]snitch stats export true
+
+        :param ctx: The Discord Red command context.
+        :type ctx: commands.Context
+        :param enabled: Whether to write the file.
+        :type enabled: bool
+        """
+        await self.config.metrics_export.set(enabled)
+        if enabled:
+            self.metrics.start_export(self._metrics_path())
+            await ctx.send(f"Writing stats to {self._metrics_path()}.")
+        else:
+            self.metrics.stop_export()
+            await ctx.send("Stopped writing stats.")
+
+    def _metrics_path(self):
+        return cog_data_path(cog_instance=self) / "metrics.prom"
+
+    def _dispatch_stat(self, name: str) -> float:
+        return self.dispatcher.stats()[name]
+
     async def _send_to_member(
         self,
         member: discord.Member,
@@ -286,7 +549,8 @@ class Snitch(commands.Cog):
         """DM a member.
 
         Note that there are a lot of failure cases here based on permissions of the bot and privacy settings of server
-        members. These get logged in case the bot owner needs to investigate.
+        members. These are left to the dispatcher, which retries rate limits and logs everything else in case the bot
+        owner needs to investigate.
 
         :param member: The member who the bot will DM.
         :type member: discord.Member
@@ -295,43 +559,96 @@ class Snitch(commands.Cog):
         :param embed: The embed to include with the message.
         :type embed: discord.Embed
         """
-        try:
-            if member.bot:
-                return
-            await member.send(content=message, embed=embed)
-            logging.info(f"Sent {message} to {member.display_name}.")
-        except Exception as e:
-            logging.error(
-                f'EXCEPTION {e}\n  Failed in sending "{message}" to {member.display_name}.'
-            )
+        if member.bot:
+            return
+        await member.send(content=message, embed=embed)
+        logging.info(f"Sent {message} to {member.display_name}.")
 
-    async def _notify_words(
+    async def _send_to_channel(
         self,
-        message: discord.Message,
-        targets: list,
-        words: list,
-        base_msg: Optional[str] = None,
+        channel: discord.TextChannel,
+        message: str,
+        embed: Optional[discord.Embed] = None,
     ):
-        """Notify the targets configured to be notifies.
+        """Post in a channel, pinging everyone.
+
+        :param channel: The channel to post in.
+        :type channel: discord.TextChannel
+        :param message: The message to send.
+        :type message: str
+        :param embed: The embed to include with the message.
+        :type embed: discord.Embed
+        """
+        await channel.send(f"@everyone {message}", embed=embed)
+        logging.info(f"Sent {message} to {channel.name}.")
+
+    def _render(self, message: discord.Message, base_msg: Optional[str], words) -> str:
+        """Fill in a group's notification message for a triggering message.
 
         :param message: The message that triggered this notification.
         :type message: discord.Message
-        :param targets: The list of targets to be notified.
-        :type targets: list
-        :param words: The list of words that triggered this notification.
-        :type words: list
-        :param base_msg: The base message to send with the notification. See _message_change() for more info.
+        :param base_msg: The group's base message. See _message_change() for more info.
         :type base_msg: Optional[str]
+        :param words: The words that triggered this notification.
+        :type words: Iterable[str]
+        :return: The message to send.
+        :rtype: str
         """
         word_msg = " and ".join(words)
         base_msg = base_msg or "Snitching on {{author}} for saying {{words}}"
-        base_msg = (
+        return (
             base_msg.replace("{{author}}", message.author.display_name)
             .replace("{{words}}", word_msg)
             .replace("{{server}}", message.guild.name)
             .replace("{{channel}}", message.channel.name)
         )
 
+    async def _notify_words(
+        self,
+        message: discord.Message,
+        hits: list,
+        coalesced: int = 0,
+    ):
+        """Notify the targets configured to be notifies.
+
+        Everyone is resolved across all the groups that matched first, so a member who is in a notified role, is
+        listed by name, and belongs to several matching groups still gets one DM covering all of them.
+
+        Sends are queued with the dispatcher rather than made here, so this returns once everything is queued.
+
+        :param message: The message that triggered this notification.
+        :type message: discord.Message
+        :param hits: (notifygroup, words) for each group that matched.
+        :type hits: list
+        :param coalesced: How many earlier matching messages were merged into this one by debouncing.
+        :type coalesced: int
+        """
+        with self.metrics.timer("notify"):
+            await self._fan_out(message, hits, coalesced)
+
+    async def _fan_out(self, message: discord.Message, hits: list, coalesced: int):
+        server = message.guild
+        # Recipient ID -> indexes into hits for the groups that reach them.
+        members = {}
+        channels = {}
+        for number, (notifygroup, _) in enumerate(hits):
+            for target in notifygroup["targets"].values():
+                target_id = target["id"]
+                target_type = target["type"]
+                if target_type == "TextChannel":
+                    channels.setdefault(target_id, []).append(number)
+                elif target_type == "Member":
+                    members.setdefault(target_id, []).append(number)
+                elif target_type == "Role":
+                    role = server.get_role(target_id)
+                    if role is None:
+                        logging.error(f"Couldn't find role {target} to notify in {server.name}.")
+                        continue
+                    for member_id in self._role_members.get(role):
+                        members.setdefault(member_id, []).append(number)
+        if not members and not channels:
+            return
+
         embed = discord.Embed(
             title=f"{message.author.display_name} in {message.channel}",
             type="link",
@@ -339,125 +656,408 @@ class Snitch(commands.Cog):
             url=message.jump_url,
             colour=discord.Color.red(),
         ).set_thumbnail(url=message.author.display_avatar.url)
-        # Loop over all the targets identified in the config and send them a message.
-        # Cap at 20 simultaneous requests.
-        waitlist = []
-        sem = asyncio.Semaphore(20)
-        for target in targets:
-            await sem.acquire()
-            try:
-                target_id = target["id"]
-                target_type = target["type"]
-                if target_type == "TextChannel":
-                    chan = message.guild.get_channel(target_id)
-                    waitlist.append(
-                        asyncio.create_task(
-                            chan.send(f"@everyone {base_msg}", embed=embed)
-                        )
-                    )
-                    logging.info(f"Sent {message} to {chan.name}.")
-                elif target_type == "Member":
-                    member = message.guild.get_member(target_id)
-                    waitlist.append(
-                        asyncio.create_task(
-                            self._send_to_member(member, base_msg, embed)
-                        )
-                    )
-                elif target_type == "Role":
-                    role = message.guild.get_role(target_id)
-                    for member in role.members:
-                        waitlist.append(
-                            asyncio.create_task(
-                                self._send_to_member(member, base_msg, embed)
-                            )
-                        )
-            except discord.RateLimited as e:
-                logging.error(
-                    f"EXCEPTION {e}\n  Hit excessive rate limit. Waiting {e.retry_after} seconds to try again."
-                )
-                await asyncio.sleep(e.retry_after)
-            except Exception as e:
-                logging.error(
-                    f"EXCEPTION {e}\n  Trying to message {target}\n  Triggered on {message.clean_content} by {message.author}"
-                )
-            finally:
-                sem.release()
-        # We only await at the end since an @everyone in a big server takes freaking forever otherwise.
-        if waitlist:
-            await asyncio.wait(waitlist, return_when=asyncio.ALL_COMPLETED)
-
-    async def _check_words(self, message: discord.Message):
+        if coalesced:
+            embed.set_footer(text=f"Plus {coalesced} earlier matching messages since the last notification.")
+        # Recipients reached by the same groups get the same text, so only build it once per combination.
+        rendered = {}
+
+        def render(numbers: list) -> str:
+            key = tuple(dict.fromkeys(numbers))
+            if key not in rendered:
+                lines = [self._render(message, hits[n][0].get("message"), hits[n][1]) for n in key]
+                rendered[key] = "\n".join(dict.fromkeys(lines))
+            return rendered[key]
+
+        # Loop over everyone identified and queue up a message for each.
+        for channel_id, numbers in channels.items():
+            chan = server.get_channel(channel_id)
+            if chan is None:
+                logging.error(f"Couldn't find channel {channel_id} to notify in {server.name}.")
+                continue
+            base_msg = render(numbers)
+            self.metrics.inc("notifications")
+            await self.dispatcher.submit(
+                ("channel", chan.id),
+                functools.partial(self._send_to_channel, chan, base_msg, embed),
+                f'"{base_msg}" to {chan.name}',
+            )
+        for member_id, numbers in members.items():
+            member = server.get_member(member_id)
+            if member is None:
+                logging.error(f"Couldn't find member {member_id} to notify in {server.name}.")
+                continue
+            self.metrics.inc("notifications")
+            await self._submit_dm(member, render(numbers), embed)
+
+    async def _submit_dm(
+        self, member: discord.Member, message: str, embed: Optional[discord.Embed]
+    ):
+        """Queue a DM to a member with the dispatcher.
+
+        :param member: The member who the bot will DM.
+        :type member: discord.Member
+        :param message: The message to send.
+        :type message: str
+        :param embed: The embed to include with the message.
+        :type embed: discord.Embed
+        """
+        await self.dispatcher.submit(
+            ("dm",),
+            functools.partial(self._send_to_member, member, message, embed),
+            f'"{message}" to {member.display_name}',
+        )
+
+    @contextlib.asynccontextmanager
+    async def _edit_groups(self, server: discord.Guild):
+        """Edit a server's notification groups, marking its cached matchers stale however the edit ends.
+
+        Config saves the groups even if the body raises, so the cache has to be invalidated either way.
+
+        :param server: The server whose groups are being edited.
+        :type server: discord.Guild
+        """
+        try:
+            async with self.config.guild(server).notifygroups() as notifygroups:
+                yield notifygroups
+        finally:
+            self._invalidate(server)
+
+    def _invalidate(self, server: discord.Guild):
+        """Mark the cached matchers for a server as stale so the next message rebuilds them.
+
+        :param server: The server whose config changed.
+        :type server: discord.Guild
+        """
+        self._config_versions[server.id] = self._config_versions.get(server.id, 0) + 1
+
+    def _cached_matchers(self, server: discord.Guild) -> Optional[Tuple[dict, GroupMatcher]]:
+        """Get the trigger matcher for a server without touching config.
+
+        :param server: The server to get matchers for.
+        :type server: discord.Guild
+        :return: The server's notification groups and matcher, or None if they need to be built.
+        :rtype: Optional[Tuple[dict, GroupMatcher]]
+        """
+        cached = self._matcher_cache.get(server.id)
+        if cached and cached[0] == self._config_versions.get(server.id, 0):
+            return cached[1]
+        return None
+
+    async def _get_matchers(self, server: discord.Guild) -> Tuple[dict, GroupMatcher]:
+        """Get the trigger matcher for a server, building it from config if the cache is stale.
+
+        The version is captured before reading config so a command that lands mid-read leaves the new entry stale
+        rather than letting an outdated build stick around.
+
+        :param server: The server to get matchers for.
+        :type server: discord.Guild
+        :return: The server's notification groups and a matcher covering all of their trigger words.
+        :rtype: Tuple[dict, GroupMatcher]
+        """
+        cached = self._cached_matchers(server)
+        if cached is not None:
+            return cached
+        version = self._config_versions.get(server.id, 0)
+        self.metrics.inc("matcher_cache_misses")
+        # Reading the value directly hands back a copy without writing anything back to config.
+        with self.metrics.timer("config_read"):
+            notifygroups = await self.config.guild(server).notifygroups()
+        matcher = self._build_matcher(notifygroups)
+        self._matcher_cache[server.id] = (version, (notifygroups, matcher))
+        return notifygroups, matcher
+
+    def _build_matcher(self, notifygroups: dict) -> GroupMatcher:
+        """Build one matcher covering every notification group's trigger words.
+
+        :param notifygroups: The server's notification groups.
+        :type notifygroups: dict
+        :return: The matcher.
+        :rtype: GroupMatcher
+        """
+        with self.metrics.timer("matcher_build"):
+            return GroupMatcher(
+                {name: group.get("words") for name, group in notifygroups.items()},
+                {name for name, group in notifygroups.items() if group.get("normalize")},
+            )
+
+    async def _warm_up(self):
+        """Build every server's matchers in the background so first messages after a restart don't pay for it.
+
+        All servers' config is read in one go, then matchers are built a time slice at a time, yielding to the event
+        loop in between so messages keep flowing. A server whose matchers were built by a message in the meantime is
+        skipped, and one whose config changed since the read is left for its next message to build.
+        """
+        started = time.perf_counter()
+        versions = dict(self._config_versions)
+        all_guilds = await self.config.all_guilds()
+        built = 0
+        slice_started = time.perf_counter()
+        for guild_id, settings in all_guilds.items():
+            version = versions.get(guild_id, 0)
+            if self._config_versions.get(guild_id, 0) != version or guild_id in self._matcher_cache:
+                continue
+            notifygroups = settings.get("notifygroups", {})
+            self._matcher_cache[guild_id] = (version, (notifygroups, self._build_matcher(notifygroups)))
+            built += 1
+            if time.perf_counter() - slice_started >= WARM_UP_SLICE:
+                await asyncio.sleep(0)
+                slice_started = time.perf_counter()
+        self.metrics.inc("warmed_matchers", built)
+        self.metrics.observe("warm_up", time.perf_counter() - started)
+        logging.info(f"Built trigger matchers for {built} servers in {time.perf_counter() - started:.2f}s.")
+
+    def _coalesce(
+        self, message: discord.Message, group: str, notifygroup: dict, matches: set
+    ) -> bool:
+        """Fold a match into the group's open debounce window, or open a new one.
+
+        :param message: The message that matched.
+        :type message: discord.Message
+        :param group: The notification group name.
+        :type group: str
+        :param notifygroup: The notification group config.
+        :type notifygroup: dict
+        :param matches: The words that matched.
+        :type matches: set
+        :return: True if the match was merged and shouldn't be sent now.
+        :rtype: bool
+        """
+        key = (message.guild.id, group)
+        window = self._windows.get(key)
+        if window is not None:
+            window["message"] = message
+            window["words"].update(matches)
+            window["count"] += 1
+            return True
+        debounce = notifygroup["debounce"]
+        self._windows.set(
+            key,
+            {"message": None, "words": set(), "count": 0, "notifygroup": notifygroup},
+            # A little slack so the flush always finds its window.
+            ttl=debounce + 60,
+        )
+        # A task rather than a bare timer, so unloading can cancel windows that haven't closed yet.
+        task = asyncio.create_task(self._flush_window(key, debounce))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+        return False
+
+    async def _flush_window(self, key: tuple, delay: float = 0):
+        """Close a debounce window, sending a digest if anything was merged into it.
+
+        :param key: The (guild ID, group) of the window.
+        :type key: tuple
+        :param delay: How long to wait before closing it, in seconds.
+        :type delay: float
+        """
+        await asyncio.sleep(delay)
+        window = self._windows.pop(key)
+        if not window or not window["count"]:
+            return
+        await self._notify_words(
+            window["message"],
+            [(window["notifygroup"], window["words"])],
+            coalesced=window["count"] - 1,
+        )
+
+    async def _check_words(
+        self,
+        message: discord.Message,
+        edit: bool = False,
+        found: Optional[Dict[str, Set[str]]] = None,
+        matchers: Optional[Tuple[dict, GroupMatcher]] = None,
+    ):
         """Check whether we really should notify people.
 
         :param message: The message to check for trigger words.
         :type message: discord.Message
+        :param edit: Whether the message is an edit of one we've already seen.
+        :type edit: bool
+        :param found: Matches already found by the caller, keyed by group, to skip matching again.
+        :type found: Optional[Dict[str, Set[str]]]
+        :param matchers: The notification groups and matcher found was made with. Groups can change while the caller
+            awaits, so found has to be read against the same groups it came from.
+        :type matchers: Optional[Tuple[dict, GroupMatcher]]
         """
         server = message.guild
 
-        async with self.config.guild(server).notifygroups() as notifygroups:
-            for notifygroup in notifygroups.values():
-                word_list = notifygroup.get("words")
-                # Escape and combine the words into a regex matching string.
-                if word_list:
-                    pattern = re.compile(
-                        "|".join(rf"\b{re.escape(w)}\b" for w in word_list), flags=re.I
-                    )
-                else:
-                    pattern = None
-                matches = None
-                if pattern:
-                    # See if there are any hits.
-                    matches = set(pattern.findall(message.content))
-                if matches:
-                    # If there are, tell the targets.
-                    await self._notify_words(
-                        message,
-                        notifygroup["targets"].values(),
-                        matches,
-                        base_msg=notifygroup.get("message"),
-                    )
+        started = time.perf_counter()
+        notifygroups, matcher = matchers or await self._get_matchers(server)
+        if found is None:
+            # One pass over the message finds hits for every group at once.
+            with self.metrics.timer("match"):
+                found = matcher.find(message.content)
+        hits = []
+        for group, matches in found.items():
+            notifygroup = notifygroups[group]
+            # Don't notify again for an edit of a message this group already heard about.
+            notified_key = (message.id, group)
+            if edit and notified_key in self._notified:
+                continue
+            self._notified.set(notified_key, True)
+            if notifygroup.get("debounce") and self._coalesce(
+                message, group, notifygroup, matches
+            ):
+                continue
+            hits.append((notifygroup, matches))
+        self.metrics.inc("group_hits", len(hits))
+        self.metrics.observe("check_words", time.perf_counter() - started)
+        # If there are, tell the targets.
+        if hits:
+            await self._notify_words(message, hits)
 
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        """Check every message the bot can see for trigger words.
+    async def _on_ingest(self, facts: MessageFacts):
+        """Check every message and edit the bot can see for trigger words.
 
-        :param message: The message.
-        :type message: discord.Message
+        :param facts: The message and what's known about it, shared with other cogs.
+        :type facts: MessageFacts
         """
-        # This can only run in servers.
-        if message.guild is None:
-            return
-        # Make sure the bot is allowed in the server.
-        if await self.bot.cog_disabled_in_guild(self, message.guild):
-            return
-        # Check if the message starts with a prefix, indicating it's a command.
-        prefixes = await self.bot.get_prefix(message)
-        prefix_check = (
-            isinstance(prefixes, str) and message.clean_content.startswith(prefixes)
-        ) or (
-            isinstance(prefixes, list)
-            and any([True for y in prefixes if message.clean_content.startswith(y)])
-        )
-        if prefix_check:
-            return
+        with self.metrics.timer("on_message"):
+            await self._handle(facts)
+
+    async def _handle(self, facts: MessageFacts):
+        message = facts.message
+        self.metrics.inc("edits" if facts.edit else "messages")
         # Check if the message was sent by an actual person.
         author = message.author
         valid_user = isinstance(author, discord.Member) and not author.bot
         if not valid_user:
             return
-        # Check if automod contexts would normally ignore this message.
-        if await self.bot.is_automod_immune(message):
+        # Rule out messages that can't trigger anything before doing any of the slower checks. Everything here is
+        # synchronous once the server's matcher is cached.
+        matchers = self._cached_matchers(facts.guild) or await self._get_matchers(facts.guild)
+        _, matcher = matchers
+        with self.metrics.timer("match"):
+            if not matcher.could_match(message.content):
+                self.metrics.inc("screened_out")
+                return
+            found = matcher.find(message.content)
+        if not found:
             return
+        self.metrics.inc("matched")
+        with self.metrics.timer("checks"):
+            # Make sure the bot is allowed in the server.
+            if await facts.disabled(self):
+                return
+            # Check if the message starts with a prefix, indicating it's a command.
+            if await facts.is_command():
+                return
+            # Check if automod contexts would normally ignore this message.
+            if await self.bot.is_automod_immune(message):
+                return
         # Now we shuffle the work off to another method.
-        await self._check_words(message)
+        await self._check_words(message, facts.edit, found, matchers)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        """Keep cached role membership and indexed names current.
+
+        :param before: The member before the update.
+        :type before: discord.Member
+        :param after: The member after the update.
+        :type after: discord.Member
+        """
+        if before.roles != after.roles:
+            self._role_members.update_member(before, after)
+        self._names.update_member(before, after)
+
+    @commands.Cog.listener()
+    async def on_user_update(self, before: discord.User, after: discord.User):
+        """Keep indexed usernames current.
+
+        :param before: The user before the update.
+        :type before: discord.User
+        :param after: The user after the update.
+        :type after: discord.User
+        """
+        self._names.rename_user(before, after)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member):
+        """Add new members to cached role membership and index their names.
+
+        :param member: The member who joined.
+        :type member: discord.Member
+        """
+        self._role_members.add_member(member)
+        self._names.add_member(member)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member):
+        """Drop members who leave from cached role membership.
+
+        :param member: The member who left.
+        :type member: discord.Member
+        """
+        self._role_members.remove_member(member)
+        self._names.remove_member(member)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role):
+        """Forget cached membership for deleted roles.
+
+        :param role: The deleted role.
+        :type role: discord.Role
+        """
+        self._role_members.remove_role(role)
+        self._names.remove_role(role)
+
+    @commands.Cog.listener()
+    async def on_guild_role_create(self, role: discord.Role):
+        """Index new roles' names.
+
+        :param role: The new role.
+        :type role: discord.Role
+        """
+        self._names.add_role(role)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        """Keep indexed role names current.
+
+        :param before: The role before the update.
+        :type before: discord.Role
+        :param after: The role after the update.
+        :type after: discord.Role
+        """
+        self._names.update_role(before, after)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_create(self, channel: discord.abc.GuildChannel):
+        """Index new channels' names.
+
+        :param channel: The new channel.
+        :type channel: discord.abc.GuildChannel
+        """
+        self._names.add_channel(channel)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        """Drop deleted channels from the name index.
+
+        :param channel: The deleted channel.
+        :type channel: discord.abc.GuildChannel
+        """
+        self._names.remove_channel(channel)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(
+        self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel
+    ):
+        """Keep indexed channel names current.
+
+        :param before: The channel before the update.
+        :type before: discord.abc.GuildChannel
+        :param after: The channel after the update.
+        :type after: discord.abc.GuildChannel
+        """
+        self._names.update_channel(before, after)
 
     @commands.Cog.listener()
-    async def on_message_edit(self, _prior, message: discord.Message):
-        """Check every edit the bot can see for trigger words.
+    async def on_guild_remove(self, guild: discord.Guild):
+        """Forget the name index for servers the bot leaves.
 
-        :param _prior: The message prior to editing.
-        :type _prior: None
-        :param message: The message post edit.
-        :type message: dicord.Message
+        :param guild: The server.
+        :type guild: discord.Guild
         """
-        await self.on_message(message)
+        self._names.forget(guild)
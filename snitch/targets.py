@@ -0,0 +1,303 @@
+import asyncio
+from typing import Dict, Optional, Set, Union
+import discord
+
+# How many names to index before letting other tasks run.
+INDEX_CHUNK = 1000
+
+
+class RoleMembers:
+    """Cached member IDs for roles that notifications go to.
+
+    `role.members` walks every member in the server, which adds up fast when a role is notified on every match.
+    Each role's members are collected once on first use and then kept current from member join, update, and remove
+    events. Nothing is cached until the server's members have finished loading, since a partial list would stick.
+    """
+
+    def __init__(self):
+        self._members: Dict[int, Set[int]] = {}
+
+    def get(self, role: discord.Role) -> Set[int]:
+        """Get the IDs of everyone with a role.
+
+        :param role: The role.
+        :type role: discord.Role
+        :return: Member IDs. Don't modify this, it's the cache.
+        :rtype: Set[int]
+        """
+        members = self._members.get(role.id)
+        if members is None:
+            members = {member.id for member in role.members}
+            if role.guild.chunked:
+                self._members[role.id] = members
+        return members
+
+    def add_member(self, member: discord.Member):
+        """Add a member who joined the server to every cached role they have, including the default role.
+
+        :param member: The member.
+        :type member: discord.Member
+        """
+        for role in member.roles:
+            if role.id in self._members:
+                self._members[role.id].add(member.id)
+
+    def update_member(self, before: discord.Member, after: discord.Member):
+        """Move a member between cached roles after their roles change.
+
+        :param before: The member before the update.
+        :type before: discord.Member
+        :param after: The member after the update.
+        :type after: discord.Member
+        """
+        before_roles = {role.id for role in before.roles}
+        after_roles = {role.id for role in after.roles}
+        for role_id in before_roles - after_roles:
+            if role_id in self._members:
+                self._members[role_id].discard(after.id)
+        for role_id in after_roles - before_roles:
+            if role_id in self._members:
+                self._members[role_id].add(after.id)
+
+    def remove_member(self, member: discord.Member):
+        """Drop a member who left the server from every cached role.
+
+        :param member: The member.
+        :type member: discord.Member
+        """
+        for role in member.roles:
+            if role.id in self._members:
+                self._members[role.id].discard(member.id)
+
+    def remove_role(self, role: discord.Role):
+        """Forget a deleted role.
+
+        :param role: The role.
+        :type role: discord.Role
+        """
+        self._members.pop(role.id, None)
+
+
+class NameIndex:
+    """Lowercased names of roles, members, and text channels per server, for resolving targets typed by name.
+
+    A server is indexed the first time a name is looked up in it, a chunk at a time so large servers don't stall the
+    bot, and then kept current from create, update, and delete events. Lookups check the object still has the name
+    before returning it, so an event that lands mid-build can't leave a wrong answer behind.
+    """
+
+    def __init__(self):
+        # Guild ID -> kind -> lowercased name -> IDs with that name, in the order the server lists them.
+        self._names: Dict[int, Dict[str, Dict[str, Dict[int, None]]]] = {}
+        self._builds: Dict[int, asyncio.Task] = {}
+
+    async def ready(self, guild: discord.Guild):
+        """Make sure a server is indexed, building it if needed.
+
+        :param guild: The server.
+        :type guild: discord.Guild
+        """
+        task = self._builds.get(guild.id)
+        if task is None or (task.done() and (task.cancelled() or task.exception() is not None)):
+            task = self._builds[guild.id] = asyncio.create_task(self._build(guild))
+        # Shielded so a cancelled command doesn't throw away a build other lookups are waiting on.
+        await asyncio.shield(task)
+
+    def find(
+        self, guild: discord.Guild, name: str
+    ) -> Optional[Union[discord.Role, discord.Member, discord.TextChannel]]:
+        """Find a role, member, or text channel by name, checked in that order. Only call after ready().
+
+        :param guild: The server.
+        :type guild: discord.Guild
+        :param name: The name, or for members the display name. Case insensitive.
+        :type name: str
+        :return: The first match, or None.
+        :rtype: Optional[Union[discord.Role, discord.Member, discord.TextChannel]]
+        """
+        names = self._names.get(guild.id)
+        if names is None:
+            return None
+        key = name.lower()
+        for role_id in names["roles"].get(key, ()):
+            role = guild.get_role(role_id)
+            if role is not None and role.name.lower() == key:
+                return role
+        for member_id in names["members"].get(key, ()):
+            member = guild.get_member(member_id)
+            if member is not None and key in (member.name.lower(), member.display_name.lower()):
+                return member
+        for channel_id in names["channels"].get(key, ()):
+            channel = guild.get_channel(channel_id)
+            if isinstance(channel, discord.TextChannel) and channel.name.lower() == key:
+                return channel
+        return None
+
+    async def _build(self, guild: discord.Guild):
+        names = {"roles": {}, "members": {}, "channels": {}}
+        # Events start landing in the partial index right away.
+        self._names[guild.id] = names
+        for number, role in enumerate(list(guild.roles), 1):
+            self._add(names["roles"], role.name, role.id)
+            if number % INDEX_CHUNK == 0:
+                await asyncio.sleep(0)
+        for number, member in enumerate(list(guild.members), 1):
+            self._add(names["members"], member.name, member.id)
+            self._add(names["members"], member.display_name, member.id)
+            if number % INDEX_CHUNK == 0:
+                await asyncio.sleep(0)
+        for channel in list(guild.channels):
+            if isinstance(channel, discord.TextChannel):
+                self._add(names["channels"], channel.name, channel.id)
+
+    @staticmethod
+    def _add(index: Dict[str, Dict[int, None]], name: str, id: int):
+        index.setdefault(name.lower(), {})[id] = None
+
+    @staticmethod
+    def _discard(index: Dict[str, Dict[int, None]], name: str, id: int):
+        key = name.lower()
+        ids = index.get(key)
+        if ids is not None:
+            ids.pop(id, None)
+            if not ids:
+                del index[key]
+
+    def _kind(self, guild: discord.Guild, kind: str) -> Optional[Dict[str, Dict[int, None]]]:
+        names = self._names.get(guild.id)
+        return names[kind] if names is not None else None
+
+    def add_member(self, member: discord.Member):
+        """Index a member who joined.
+
+        :param member: The member.
+        :type member: discord.Member
+        """
+        index = self._kind(member.guild, "members")
+        if index is not None:
+            self._add(index, member.name, member.id)
+            self._add(index, member.display_name, member.id)
+
+    def remove_member(self, member: discord.Member):
+        """Drop a member who left.
+
+        :param member: The member.
+        :type member: discord.Member
+        """
+        index = self._kind(member.guild, "members")
+        if index is not None:
+            self._discard(index, member.name, member.id)
+            self._discard(index, member.display_name, member.id)
+
+    def update_member(self, before: Union[discord.Member, discord.User], after: discord.Member):
+        """Reindex a member whose name or nickname changed.
+
+        :param before: The member, or the user for username changes, before the update.
+        :type before: Union[discord.Member, discord.User]
+        :param after: The member after the update.
+        :type after: discord.Member
+        """
+        index = self._kind(after.guild, "members")
+        if index is None:
+            return
+        old = {before.name, getattr(before, "display_name", before.name)}
+        if old == {after.name, after.display_name}:
+            return
+        for name in old:
+            self._discard(index, name, after.id)
+        self._add(index, after.name, after.id)
+        self._add(index, after.display_name, after.id)
+
+    def rename_user(self, before: discord.User, after: discord.User):
+        """Reindex a user's username in every indexed server they're in.
+
+        :param before: The user before the update.
+        :type before: discord.User
+        :param after: The user after the update.
+        :type after: discord.User
+        """
+        if before.name == after.name and before.display_name == after.display_name:
+            return
+        for guild in after.mutual_guilds:
+            member = guild.get_member(after.id)
+            if member is not None and guild.id in self._names:
+                index = self._names[guild.id]["members"]
+                self._discard(index, before.name, after.id)
+                self._discard(index, before.display_name, after.id)
+                self._add(index, member.name, member.id)
+                self._add(index, member.display_name, member.id)
+
+    def add_role(self, role: discord.Role):
+        """Index a new role.
+
+        :param role: The role.
+        :type role: discord.Role
+        """
+        index = self._kind(role.guild, "roles")
+        if index is not None:
+            self._add(index, role.name, role.id)
+
+    def remove_role(self, role: discord.Role):
+        """Drop a deleted role.
+
+        :param role: The role.
+        :type role: discord.Role
+        """
+        index = self._kind(role.guild, "roles")
+        if index is not None:
+            self._discard(index, role.name, role.id)
+
+    def update_role(self, before: discord.Role, after: discord.Role):
+        """Reindex a renamed role.
+
+        :param before: The role before the update.
+        :type before: discord.Role
+        :param after: The role after the update.
+        :type after: discord.Role
+        """
+        if before.name != after.name:
+            self.remove_role(before)
+            self.add_role(after)
+
+    def add_channel(self, channel: discord.abc.GuildChannel):
+        """Index a new text channel. Other kinds of channel are ignored.
+
+        :param channel: The channel.
+        :type channel: discord.abc.GuildChannel
+        """
+        index = self._kind(channel.guild, "channels")
+        if index is not None and isinstance(channel, discord.TextChannel):
+            self._add(index, channel.name, channel.id)
+
+    def remove_channel(self, channel: discord.abc.GuildChannel):
+        """Drop a deleted channel.
+
+        :param channel: The channel.
+        :type channel: discord.abc.GuildChannel
+        """
+        index = self._kind(channel.guild, "channels")
+        if index is not None:
+            self._discard(index, channel.name, channel.id)
+
+    def update_channel(self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
+        """Reindex a renamed channel, or one that changed type.
+
+        :param before: The channel before the update.
+        :type before: discord.abc.GuildChannel
+        :param after: The channel after the update.
+        :type after: discord.abc.GuildChannel
+        """
+        if before.name != after.name or type(before) is not type(after):
+            self.remove_channel(before)
+            self.add_channel(after)
+
+    def forget(self, guild: discord.Guild):
+        """Drop a server the bot left.
+
+        :param guild: The server.
+        :type guild: discord.Guild
+        """
+        self._names.pop(guild.id, None)
+        task = self._builds.pop(guild.id, None)
+        if task is not None:
+            task.cancel()